@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
 import sqlite3
-import functools
-from datetime import datetime
+import logging
 
-# Decorator to log SQL queries
-def log_queries(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        query = kwargs.get('query') if 'query' in kwargs else args[0] if args else ''
-        print(f"[{datetime.now()}] Executing query: {query}")
-        return func(*args, **kwargs)
-    return wrapper
+from query_instrumentation import instrument_query, instrumentation
+from query_stats import query_stats
+
+# Decorator to log SQL queries (works on sync and async functions).
+# Records fingerprint, params hash, wall time, rows and error into a ring
+# buffer flushed in the background to the "query_log" logger; tune with
+# query_instrumentation.configure(enabled=..., sample_rate=...,
+# slow_threshold=...).
+# Every call also feeds query_stats: per-fingerprint latency histograms,
+# query_stats.report() for the slowest, query_stats.serve() for /metrics
+log_queries = instrument_query
+query_stats.attach()
 
 @log_queries
 def fetch_all_users(query):
@@ -23,5 +26,8 @@ def fetch_all_users(query):
 
 # Fetch users while logging the query
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
     users = fetch_all_users(query="SELECT * FROM users")
     print(users)
+    instrumentation.flush()
+    print(query_stats.report())
@@ -1,9 +1,22 @@
 #!/usr/bin/env python3
 import sqlite3
 import functools
+import inspect
+
+from connection_pool import get_async_pool, get_pool
 
 # Decorator to automatically handle DB connection
+# (async functions get an aiosqlite connection)
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        import aiosqlite
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with aiosqlite.connect("users.db") as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         # Create DB connection
@@ -17,13 +30,45 @@ def with_db_connection(func):
         return result
     return wrapper
 
+# Same as with_db_connection, but borrows the connection from the
+# users.db pool instead of opening and closing one on every call
+def with_pooled_connection(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            pool = get_async_pool("users.db")
+            conn = await pool.acquire()
+            try:
+                return await func(conn, *args, **kwargs)
+            finally:
+                await pool.release(conn)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        pool = get_pool("users.db")
+        conn = pool.acquire()
+        try:
+            return func(conn, *args, **kwargs)
+        finally:
+            # Hand the connection back (rolled back if left mid-transaction)
+            pool.release(conn)
+    return wrapper
+
 @with_db_connection
 def get_user_by_id(conn, user_id):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
     return cursor.fetchone()
 
+@with_pooled_connection
+def get_user_by_id_pooled(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    return cursor.fetchone()
+
 # Fetch user by ID with automatic connection handling
 if __name__ == "__main__":
     user = get_user_by_id(user_id=1)
     print(user)
+    print(get_user_by_id_pooled(user_id=1))
@@ -1,11 +1,32 @@
 #!/usr/bin/env python3
 import sqlite3
 import functools
+import inspect
+import itertools
+import threading
+import time
+from contextlib import ContextDecorator
+
+from query_cache import query_cache, written_table
 
 # Decorator to automatically handle DB connection
+# (async functions get an aiosqlite connection)
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        import aiosqlite
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with aiosqlite.connect("users.db") as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        # Inside batch_transactions, reuse the batch's connection
+        batch = current_batch()
+        if batch is not None:
+            return func(batch.conn, *args, **kwargs)
         conn = sqlite3.connect("users.db")
         try:
             result = func(conn, *args, **kwargs)
@@ -16,23 +37,199 @@ def with_db_connection(func):
 
 # Decorator to manage database transactions
 def transactional(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(conn, *args, **kwargs):
+            # Same as below on an aiosqlite connection
+            written = set()
+            trace = getattr(conn, "set_trace_callback", None)
+            if trace:
+                await trace(lambda statement: written.add(written_table(statement)))
+            try:
+                result = await func(conn, *args, **kwargs)
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                raise e
+            finally:
+                if trace:
+                    await trace(None)
+            written.discard(None)
+            query_cache.invalidate_tables(written)
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
+        batch = current_batch()
+        if batch is not None and batch.conn is conn:
+            return batch.run(func, conn, *args, **kwargs)
+        # Record the tables written in this transaction (sqlite3 only) so
+        # their cached query results can be dropped once it commits
+        written = set()
+        trace = getattr(conn, "set_trace_callback", None)
+        if trace:
+            trace(lambda statement: written.add(written_table(statement)))
         try:
             result = func(conn, *args, **kwargs)
             conn.commit()  # Commit if no error
-            return result
         except Exception as e:
             conn.rollback()  # Rollback on error
             raise e  # Re-raise the exception
+        finally:
+            if trace:
+                trace(None)
+        written.discard(None)
+        query_cache.invalidate_tables(written)
+        return result
     return wrapper
 
+# Groups the transactional calls made inside it (on this thread) into
+# shared transactions on one users.db connection, committed every `every`
+# operations or once `interval_ms` has passed since the transaction
+# began (checked between operations). Each call runs under a SAVEPOINT,
+# so a failing call rolls back alone and re-raises while the rest of the
+# batch goes on. Whatever is pending commits when the block exits
+# normally and rolls back if it raises. Works as a decorator too: every
+# call of the decorated function (on any thread) runs in a fresh batch
+# with the same settings, so the decorating instance's counters stay 0.
+class batch_transactions(ContextDecorator):
+    def __init__(self, every=1000, interval_ms=None, path="users.db"):
+        self.every = every
+        self.interval_ms = interval_ms
+        self.path = path
+        self.conn = None
+        self.committed = 0  # operations committed
+        self.failed = 0     # operations rolled back to their savepoint
+        self.commits = 0
+        self._pending = 0
+        self._began = None
+        self._written = set()
+        self._outer = None
+
+    def _recreate_cm(self):
+        # ContextDecorator's hook: a batch holds per-call state (its
+        # connection, counters and outer batch), so calls can't share one
+        return type(self)(self.every, self.interval_ms, self.path)
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.path)
+        # Transactions are managed here: BEGIN, SAVEPOINT and COMMIT by hand
+        self.conn.isolation_level = None
+        self.conn.set_trace_callback(
+            lambda statement: self._written.add(written_table(statement)))
+        self._outer = current_batch()
+        _batches.current = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _batches.current = self._outer
+        try:
+            if exc_type is None:
+                self.commit()
+            elif self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+                self._pending = 0
+        finally:
+            self.conn.close()
+            self.conn = None
+        return False
+
+    def run(self, func, conn, *args, **kwargs):
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+            self._began = time.monotonic()
+        conn.execute("SAVEPOINT batch_item")
+        try:
+            result = func(conn, *args, **kwargs)
+        except Exception:
+            conn.execute("ROLLBACK TO batch_item")
+            conn.execute("RELEASE batch_item")
+            self.failed += 1
+            raise
+        conn.execute("RELEASE batch_item")
+        self._pending += 1
+        if self._pending >= self.every or (
+                self.interval_ms is not None
+                and (time.monotonic() - self._began) * 1000 >= self.interval_ms):
+            self.commit()
+        return result
+
+    def commit(self):
+        if self.conn.in_transaction:
+            self.conn.execute("COMMIT")
+            self.commits += 1
+        self.committed += self._pending
+        self._pending = 0
+        written, self._written = self._written, set()
+        written.discard(None)
+        query_cache.invalidate_tables(written)
+
+
+_batches = threading.local()
+
+
+def current_batch():
+    return getattr(_batches, "current", None)
+
 @with_db_connection
 @transactional
 def update_user_email(conn, user_id, new_email):
     cursor = conn.cursor()
     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
 
+# Bulk form of update_user_email for an iterable of (user_id, new_email)
+# pairs, all in one transaction. Pairs are streamed in chunks of
+# chunk_size through executemany, or with method="join" loaded into a
+# temp table and applied by one UPDATE ... FROM (SQLite 3.33+). Later
+# pairs for the same user win either way. Returns rows updated, seconds
+# and rows_per_sec.
+@with_db_connection
+@transactional
+def update_user_emails(conn, pairs, chunk_size=5000, method="executemany"):
+    started = time.perf_counter()
+    pairs = iter(pairs)
+    cursor = conn.cursor()
+    rows = 0
+    if method == "executemany":
+        while True:
+            chunk = [(email, user_id)
+                     for user_id, email in itertools.islice(pairs, chunk_size)]
+            if not chunk:
+                break
+            cursor.executemany("UPDATE users SET email = ? WHERE id = ?", chunk)
+            rows += cursor.rowcount
+    elif method == "join":
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS email_updates "
+                       "(user_id INTEGER PRIMARY KEY, email TEXT)")
+        cursor.execute("DELETE FROM email_updates")
+        while True:
+            chunk = list(itertools.islice(pairs, chunk_size))
+            if not chunk:
+                break
+            cursor.executemany(
+                "INSERT OR REPLACE INTO email_updates VALUES (?, ?)", chunk)
+        cursor.execute("UPDATE users SET email = u.email FROM email_updates AS u "
+                       "WHERE users.id = u.user_id")
+        rows = cursor.rowcount
+        cursor.execute("DELETE FROM email_updates")
+    else:
+        raise ValueError(f"Unknown method: {method}")
+    seconds = time.perf_counter() - started
+    return {"rows": rows, "seconds": seconds,
+            "rows_per_sec": rows / seconds if seconds else None}
+
 # Update user's email with automatic transaction handling
 if __name__ == "__main__":
     update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
+
+    # Many updates, one commit per 1000 of them
+    with batch_transactions(every=1000) as batch:
+        for user_id in range(1, 101):
+            update_user_email(user_id=user_id, new_email=f'user{user_id}@example.com')
+    print(f"{batch.committed} updates in {batch.commits} commits")
+
+    # Or hand all the pairs over at once
+    report = update_user_emails(
+        (user_id, f'bulk{user_id}@example.com') for user_id in range(1, 101))
+    print(f"{report['rows']} rows at {report['rows_per_sec']:.0f} rows/s")
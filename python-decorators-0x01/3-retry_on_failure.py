@@ -1,10 +1,22 @@
 #!/usr/bin/env python3
-import time
 import sqlite3
 import functools
+import inspect
+
+from retry_policy import RetryPolicy, retry_stats
 
 # Decorator to automatically handle DB connection
+# (async functions get an aiosqlite connection)
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        import aiosqlite
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with aiosqlite.connect("users.db") as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         conn = sqlite3.connect("users.db")
@@ -15,22 +27,24 @@ def with_db_connection(func):
         return result
     return wrapper
 
-# Decorator to retry on failure
-def retry_on_failure(retries=3, delay=2):
+# Decorator to retry transient failures (locked/busy database, lost
+# connection) with jittered exponential backoff starting around `delay`;
+# other errors are raised at once. Pass a RetryPolicy for a deadline,
+# a different breaker or classifier. Counters: retry_stats.snapshot()
+# (async functions back off with asyncio.sleep, so the loop keeps running)
+def retry_on_failure(retries=3, delay=2, policy=None):
+    policy = policy or RetryPolicy(retries=retries, base_delay=delay)
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await policy.call_async(func, *args, **kwargs)
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(1, retries + 1):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    print(f"Attempt {attempt} failed: {e}")
-                    if attempt < retries:
-                        time.sleep(delay)
-            print(f"All {retries} attempts failed.")
-            raise last_exception  # Re-raise last exception after all retries fail
+            return policy.call(func, *args, **kwargs)
         return wrapper
     return decorator
 
@@ -45,3 +59,4 @@ def fetch_users_with_retry(conn):
 if __name__ == "__main__":
     users = fetch_users_with_retry()
     print(users)
+    print(retry_stats.snapshot())
@@ -2,12 +2,24 @@
 import time
 import sqlite3
 import functools
+import inspect
 
-# Global cache dictionary
-query_cache = {}
+# Shared, bounded query cache (LRU by entries and bytes, TTL, invalidated
+# by writes that go through transactional)
+from query_cache import make_key, query_cache
 
 # Decorator to automatically handle DB connection
+# (async functions get an aiosqlite connection)
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        import aiosqlite
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with aiosqlite.connect("users.db") as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         conn = sqlite3.connect("users.db")
@@ -18,33 +30,61 @@ def with_db_connection(func):
         return result
     return wrapper
 
-# Decorator to cache query results based on SQL query string
+# Decorator to cache query results based on the SQL query and its parameters
 def cache_query(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(conn, *args, **kwargs):
+            query = kwargs.get("query") if "query" in kwargs else args[0] if args else None
+            params = kwargs.get("params") if "params" in kwargs else args[1] if len(args) > 1 else None
+            key = make_key(query, params)
+            loaded = False
+
+            async def load():
+                nonlocal loaded
+                loaded = True
+                print(f"[CACHE MISS] Executing and caching result for: {query}")
+                return await func(conn, *args, **kwargs)
+            result = await query_cache.get_or_load_async(key, load)
+            if not loaded:
+                print(f"[CACHE HIT] Returning cached result for: {query}")
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
         query = kwargs.get("query") if "query" in kwargs else args[0] if args else None
+        params = kwargs.get("params") if "params" in kwargs else args[1] if len(args) > 1 else None
+        key = make_key(query, params)
+        loaded = False
 
-        if query in query_cache:
+        # One lookup per call; concurrent misses on the same key share a
+        # single execution
+        def load():
+            nonlocal loaded
+            loaded = True
+            print(f"[CACHE MISS] Executing and caching result for: {query}")
+            return func(conn, *args, **kwargs)
+        result = query_cache.get_or_load(key, load)
+        if not loaded:
             print(f"[CACHE HIT] Returning cached result for: {query}")
-            return query_cache[query]
-
-        print(f"[CACHE MISS] Executing and caching result for: {query}")
-        result = func(conn, *args, **kwargs)
-        query_cache[query] = result
         return result
     return wrapper
 
 @with_db_connection
 @cache_query
-def fetch_users_with_cache(conn, query):
+def fetch_users_with_cache(conn, query, params=()):
     cursor = conn.cursor()
-    cursor.execute(query)
+    cursor.execute(query, params)
     return cursor.fetchall()
 
-# First call will cache the result
-users = fetch_users_with_cache(query="SELECT * FROM users")
-print(users)
+if __name__ == "__main__":
+    # First call will cache the result
+    users = fetch_users_with_cache(query="SELECT * FROM users")
+    print(users)
+
+    # Second call will use the cached result
+    users_again = fetch_users_with_cache(query="SELECT * FROM users")
+    print(users_again)
 
-# Second call will use the cached result
-users_again = fetch_users_with_cache(query="SELECT * FROM users")
-print(users_again)
+    print(query_cache.stats())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+transactional_module = __import__('2-transactional')
+batch_transactions = transactional_module.batch_transactions
+update_user_email = transactional_module.update_user_email
+update_user_emails = transactional_module.update_user_emails
+
+
+# Fresh users.db in the current directory with `count` users
+def create_users(count):
+    if os.path.exists("users.db"):
+        os.remove("users.db")
+    conn = sqlite3.connect("users.db")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT)")
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?)",
+                     ((i, f"user{i}", f"user{i}@example.com")
+                      for i in range(1, count + 1)))
+    conn.commit()
+    conn.close()
+
+
+def run_per_call(count):
+    for user_id in range(1, count + 1):
+        update_user_email(user_id=user_id, new_email=f"new{user_id}@example.com")
+
+
+def run_batched(count, every):
+    with batch_transactions(every=every):
+        for user_id in range(1, count + 1):
+            update_user_email(user_id=user_id, new_email=f"new{user_id}@example.com")
+
+
+def run_bulk(count, method):
+    update_user_emails(((user_id, f"new{user_id}@example.com")
+                        for user_id in range(1, count + 1)), method=method)
+
+
+# Time `count` email updates: update_user_email committed one by one,
+# batched, and update_user_emails (executemany and temp-table join)
+def benchmark(count=100000, every=1000):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for name, run in (("per-call commit", lambda: run_per_call(count)),
+                              (f"batched ({every}/commit)",
+                               lambda: run_batched(count, every)),
+                              ("bulk executemany",
+                               lambda: run_bulk(count, "executemany")),
+                              ("bulk temp-table join",
+                               lambda: run_bulk(count, "join"))):
+                create_users(count)
+                started = time.perf_counter()
+                run()
+                results[name] = time.perf_counter() - started
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-call commit vs batched vs bulk email updates")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--every", type=int, default=1000)
+    args = parser.parse_args()
+
+    results = benchmark(args.count, args.every)
+    baseline = next(iter(results.values()))
+    for name, seconds in results.items():
+        print(f"{name:>24}: {seconds:8.2f}s  {args.count / seconds:10.0f} updates/s"
+              f"  x{baseline / seconds:.1f}")
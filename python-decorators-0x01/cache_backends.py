@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+import fcntl
+import hashlib
+import marshal
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+# Storage backends for QueryCache. Every backend implements
+#   get(key) -> (found, value), set(key, value, tables, expires_at),
+#   invalidate_tables(tables) -> count, clear(), stats() -> dict
+# Expiry times are wall-clock (time.time()) so they mean the same thing in
+# every process sharing a backend.
+
+
+# Compact serialization for result rows.
+# A result set that is a list of equal-width tuples (what sqlite3's
+# fetchall returns) is stored column by column: integer columns as packed
+# arrays of the narrowest width that fits, float columns as packed
+# doubles, and anything else as a marshalled tuple. That drops the
+# per-row framing pickle pays for, and decoding is a few C-level calls
+# plus one zip. Other values are marshalled, or pickled as a last resort;
+# values none of these can handle (sqlite3.Row, say) raise TypeError and
+# QueryCache skips storing them.
+# The header records the format and marshal version, so a blob written by
+# another interpreter version reads as a miss instead of garbage.
+_ROWS = b'R' + bytes([marshal.version])
+_MARSHAL = b'M' + bytes([marshal.version])
+_PICKLE = b'P'
+_INT_CODES = [(code, 1 << (8 * array(code).itemsize - 1)) for code in 'bhiq']
+
+
+def _encode_column(values):
+    kinds = {type(v) for v in values}
+    if kinds == {int}:
+        low, high = min(values), max(values)
+        for code, limit in _INT_CODES:
+            if -limit <= low and high < limit:
+                return code, array(code, values).tobytes()
+    elif kinds == {float}:
+        return 'd', array('d', values).tobytes()
+    return 'm', values
+
+
+def _encode_rows(rows):
+    width = len(rows[0])
+    if any(type(row) is not tuple or len(row) != width for row in rows):
+        return None
+    columns = [_encode_column(column) for column in zip(*rows)]
+    return _ROWS + marshal.dumps((len(rows), columns))
+
+
+def _decode_rows(data):
+    count, columns = marshal.loads(data)
+    decoded = []
+    for kind, payload in columns:
+        if kind == 'm':
+            decoded.append(payload)
+        else:
+            values = array(kind)
+            values.frombytes(payload)
+            decoded.append(values)
+    if not decoded:
+        return [()] * count
+    return list(zip(*decoded))
+
+
+def encode_value(value):
+    if type(value) is list and value and type(value[0]) is tuple:
+        try:
+            encoded = _encode_rows(value)
+            if encoded is not None:
+                return encoded
+        except ValueError:
+            pass
+    try:
+        return _MARSHAL + marshal.dumps(value)
+    except ValueError:
+        pass
+    try:
+        return _PICKLE + pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as error:
+        raise TypeError(f"Cannot cache a {type(value).__name__}: {error}") from error
+
+
+def decode_value(data):
+    data = bytes(data)
+    if data[:2] == _ROWS:
+        return _decode_rows(data[2:])
+    if data[:2] == _MARSHAL:
+        return marshal.loads(data[2:])
+    if data[:1] == _PICKLE:
+        return pickle.loads(data[1:])
+    raise ValueError("Unknown cache value format")
+
+
+# Stable bytes for a cache key (query, params), usable across processes.
+# repr rather than marshal: marshal output for equal values can differ
+# with string interning and object sharing.
+def encode_key(key):
+    return repr(key).encode()
+
+
+# Rough deep size of a result set (rows of tuples/dicts of scalars)
+def approx_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    return size
+
+
+# In-process LRU bounded by entry count and approximate bytes
+class MemoryBackend:
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, expires_at, size, tables)
+        self._by_table = defaultdict(set)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {'evictions': 0, 'expirations': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[1] < time.time():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[0]
+
+    def set(self, key, value, tables, expires_at):
+        size = approx_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table[table].add(key)
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        _, _, size, tables = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table[table]
+            keys.discard(key)
+            if not keys:
+                del self._by_table[table]
+
+    def invalidate_tables(self, tables):
+        removed = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(entries=len(self._entries), bytes=self._bytes)
+        return stats
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+
+# Memory-mapped, direct-mapped cache shared by processes on one host.
+# The file is split into fixed-size slots and a key lives in the slot its
+# hash selects, so a colliding key simply replaces it. Values that do not
+# fit in a slot are not cached. flock() serialises writers across
+# processes; readers take a shared lock. flock() locks belong to an open
+# file, which a forked child shares with its parent, so a backend created
+# before a pre-fork server forks reopens the file in each worker on first
+# use.
+class SharedMemoryBackend:
+    _MAGIC = b'QCSHM001'
+    _FILE_HEADER = struct.Struct('<8sII')  # magic, slots, slot_size
+    _SLOT_HEADER = struct.Struct('<16sdIH')  # key hash, expires_at, value len, tables len
+
+    def __init__(self, path, slots=4096, slot_size=4096):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self._stats = {'evictions': 0, 'expirations': 0}
+        self._open()
+
+    def _open(self):
+        # Opens (creating it with self.slots and self.slot_size if new)
+        # and maps the file for this process
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        path = self.path
+        slots, slot_size = self.slots, self.slot_size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._file = os.fdopen(fd, 'r+b')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            header = self._file.read(self._FILE_HEADER.size)
+            if len(header) == self._FILE_HEADER.size:
+                magic, slots, slot_size = self._FILE_HEADER.unpack(header)
+                if magic != self._MAGIC:
+                    raise ValueError(f"{path} is not a shared query cache")
+            else:
+                size = self._FILE_HEADER.size + slots * slot_size
+                self._file.truncate(size)
+                self._file.seek(0)
+                self._file.write(self._FILE_HEADER.pack(self._MAGIC, slots, slot_size))
+                self._file.flush()
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self.slots = slots
+        self.slot_size = slot_size
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _reopen_after_fork(self):
+        # The inherited file and lock are the parent's; closing our copies
+        # leaves its locks alone
+        self._map.close()
+        self._file.close()
+        self._open()
+
+    def _locate(self, key):
+        digest = hashlib.blake2b(encode_key(key), digest_size=16).digest()
+        slot = int.from_bytes(digest[:8], 'little') % self.slots
+        return digest, self._FILE_HEADER.size + slot * self.slot_size
+
+    # Thread lock first, then the cross-process file lock
+    @contextmanager
+    def _locked(self, kind):
+        if self._pid != os.getpid():
+            self._reopen_after_fork()
+        with self._lock:
+            fcntl.flock(self._file, kind)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def get(self, key):
+        digest, offset = self._locate(key)
+        with self._locked(fcntl.LOCK_SH):
+            stored, expires_at, length, tables_len = self._SLOT_HEADER.unpack_from(
+                self._map, offset)
+            if stored != digest or not length:
+                return False, None
+            start = offset + self._SLOT_HEADER.size + tables_len
+            data = self._map[start:start + length]
+        if expires_at < time.time():
+            self._stats['expirations'] += 1
+            return False, None
+        try:
+            return True, decode_value(data)
+        except (ValueError, EOFError, pickle.UnpicklingError):
+            return False, None
+
+    def set(self, key, value, tables, expires_at):
+        digest, offset = self._locate(key)
+        tables_blob = ",".join(sorted(tables)).encode()
+        data = encode_value(value)
+        if self._SLOT_HEADER.size + len(tables_blob) + len(data) > self.slot_size:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            stored, _, length, _ = self._SLOT_HEADER.unpack_from(self._map, offset)
+            if length and stored != digest:
+                self._stats['evictions'] += 1
+            self._SLOT_HEADER.pack_into(
+                self._map, offset, digest, expires_at, len(data), len(tables_blob))
+            start = offset + self._SLOT_HEADER.size
+            self._map[start:start + len(tables_blob)] = tables_blob
+            start += len(tables_blob)
+            self._map[start:start + len(data)] = data
+
+    def _slots(self):
+        for slot in range(self.slots):
+            offset = self._FILE_HEADER.size + slot * self.slot_size
+            yield offset, self._SLOT_HEADER.unpack_from(self._map, offset)
+
+    def invalidate_tables(self, tables):
+        removed = 0
+        with self._locked(fcntl.LOCK_EX):
+            for offset, (_, _, length, tables_len) in self._slots():
+                if not length:
+                    continue
+                start = offset + self._SLOT_HEADER.size
+                stored = set(self._map[start:start + tables_len].decode().split(","))
+                if stored & set(tables):
+                    self._SLOT_HEADER.pack_into(self._map, offset, bytes(16), 0.0, 0, 0)
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self._locked(fcntl.LOCK_EX):
+            for offset, _ in self._slots():
+                self._SLOT_HEADER.pack_into(self._map, offset, bytes(16), 0.0, 0, 0)
+
+    def stats(self):
+        with self._locked(fcntl.LOCK_SH):
+            entries = sum(1 for _, header in self._slots() if header[2])
+        stats = dict(self._stats)
+        stats.update(entries=entries, bytes=self.slots * self.slot_size)
+        return stats
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+# On-disk cache in a SQLite file that survives restarts and can be shared
+# by processes on the same host. Least recently used entries beyond
+# max_entries are evicted on write. Reads never write: hits are
+# remembered in memory and their last_used times written with this
+# process's next set(), and expired rows are removed by writes too, so
+# a busy writer elsewhere can't make a cache hit wait or fail.
+class SQLiteBackend:
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._stats = {'evictions': 0, 'expirations': 0}
+        self._stats_lock = threading.Lock()
+        self._touched = {}  # key blob -> last hit time, not yet written
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key BLOB PRIMARY KEY, value BLOB NOT NULL, "
+                "expires_at REAL NOT NULL, last_used REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_tables ("
+                "table_name TEXT NOT NULL, key BLOB NOT NULL, "
+                "PRIMARY KEY (table_name, key))")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_last_used "
+                "ON cache_entries (last_used)")
+
+    # One connection per thread; WAL lets readers run alongside a writer
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        conn = self._conn()
+        blob = encode_key(key)
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ?",
+            (blob,)).fetchone()
+        if row is None:
+            return False, None
+        now = time.time()
+        if row[1] < now:
+            self._count('expirations')
+            return False, None
+        try:
+            value = decode_value(row[0])
+        except (ValueError, EOFError, pickle.UnpicklingError):
+            return False, None
+        with self._stats_lock:
+            self._touched[blob] = now
+        return True, value
+
+    def _delete(self, conn, where, params):
+        keys = [(row[0],) for row in conn.execute(
+            f"SELECT key FROM cache_entries WHERE {where}", params)]
+        conn.executemany("DELETE FROM cache_tables WHERE key = ?", keys)
+        conn.executemany("DELETE FROM cache_entries WHERE key = ?", keys)
+        return len(keys)
+
+    def set(self, key, value, tables, expires_at):
+        conn = self._conn()
+        blob = encode_key(key)
+        data = encode_value(value)
+        with self._stats_lock:
+            touched, self._touched = self._touched, {}
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE cache_entries SET last_used = ? WHERE key = ?",
+                    [(used, touched_key) for touched_key, used in touched.items()])
+                self._delete(conn, "key = ? OR expires_at < ?", (blob, time.time()))
+                conn.execute(
+                    "INSERT INTO cache_entries (key, value, expires_at, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (blob, data, expires_at, time.time()))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO cache_tables (table_name, key) VALUES (?, ?)",
+                    [(table, blob) for table in tables])
+            evicted = self._delete(
+                conn,
+                "key IN (SELECT key FROM cache_entries "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+        except Exception:
+            # Keep the hits for the next write
+            with self._stats_lock:
+                for touched_key, used in touched.items():
+                    self._touched.setdefault(touched_key, used)
+            raise
+        if evicted:
+            self._count('evictions', evicted)
+
+    def invalidate_tables(self, tables):
+        conn = self._conn()
+        removed = 0
+        with conn:
+            for table in tables:
+                removed += self._delete(
+                    conn,
+                    "key IN (SELECT key FROM cache_tables WHERE table_name = ?)",
+                    (table,))
+        return removed
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache_tables")
+            conn.execute("DELETE FROM cache_entries")
+
+    def stats(self):
+        row = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache_entries"
+        ).fetchone()
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(entries=row[0], bytes=row[1])
+        return stats
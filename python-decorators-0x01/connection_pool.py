@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+
+# Raised when no connection frees up within the checkout timeout
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+# Thread-safe pool of sqlite3 connections to one database file.
+# A thread gets back the idle connection it used last when there is one,
+# connections idle longer than idle_timeout are closed, and every
+# connection is pinged before it is handed out.
+class SQLitePool:
+    def __init__(self, path, max_size=8, idle_timeout=60.0, timeout=5.0):
+        self.path = path
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []  # [connection, last_used, thread_id]
+        self._open = 0
+        self._lock = threading.Condition()
+
+    def _connect(self):
+        # Connections may move between threads, one holder at a time
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def _evict_idle(self, now):
+        expired = [e for e in self._idle if now - e[1] > self.idle_timeout]
+        for entry in expired:
+            self._idle.remove(entry)
+            self._open -= 1
+            entry[0].close()
+
+    def _take_idle(self):
+        me = threading.get_ident()
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i][2] == me:
+                return self._idle.pop(i)[0]
+        return self._idle.pop()[0]
+
+    def acquire(self, timeout=None):
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._evict_idle(now)
+                    if self._idle:
+                        conn = self._take_idle()
+                        break
+                    if self._open < self.max_size:
+                        self._open += 1
+                        conn = None
+                        break
+                    if now >= deadline:
+                        raise PoolTimeout(f"No connection to {self.path} available")
+                    self._lock.wait(deadline - now)
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except BaseException:
+                    self._discard(None)
+                    raise
+
+            # Validation ping; a broken connection is replaced
+            try:
+                conn.execute("SELECT 1").fetchone()
+                return conn
+            except sqlite3.Error:
+                self._discard(conn)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._lock:
+            self._idle.append([conn, time.monotonic(), threading.get_ident()])
+            self._lock.notify()
+
+    def _discard(self, conn):
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            self._open -= 1
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop()[0].close()
+                self._open -= 1
+
+
+# asyncio counterpart of SQLitePool, handing out aiosqlite connections.
+# A pool belongs to the event loop it was created on. Each aiosqlite
+# connection runs a non-daemon thread, so the pool must be closed before
+# the interpreter can exit: use it as `async with`, call close_all(), or
+# leave it to asyncio.run(), which closes it while shutting the loop down.
+class AsyncSQLitePool:
+    def __init__(self, path, max_size=8, idle_timeout=60.0, timeout=5.0):
+        self.path = path
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.closed = False
+        self._idle = []  # [connection, last_used]
+        self._open = 0
+        self._available = asyncio.Condition()
+        self._closer = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close_all()
+
+    async def _close_on_shutdown(self):
+        # Async generators still suspended when the loop shuts down are
+        # closed by loop.shutdown_asyncgens() (which asyncio.run calls),
+        # running this finally on the pool's own loop
+        try:
+            yield
+        finally:
+            await self.close_all()
+
+    async def _evict_idle(self, now):
+        expired = [e for e in self._idle if now - e[1] > self.idle_timeout]
+        for entry in expired:
+            self._idle.remove(entry)
+            self._open -= 1
+            await entry[0].close()
+
+    async def acquire(self, timeout=None):
+        import aiosqlite
+
+        if self.closed:
+            raise sqlite3.ProgrammingError(f"Pool for {self.path} is closed")
+        if self._closer is None:
+            self._closer = self._close_on_shutdown()
+            await self._closer.__anext__()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            async with self._available:
+                while True:
+                    now = loop.time()
+                    await self._evict_idle(now)
+                    if self._idle:
+                        conn = self._idle.pop()[0]
+                        break
+                    if self._open < self.max_size:
+                        self._open += 1
+                        conn = None
+                        break
+                    if now >= deadline:
+                        raise PoolTimeout(f"No connection to {self.path} available")
+                    try:
+                        await asyncio.wait_for(self._available.wait(), deadline - now)
+                    except asyncio.TimeoutError:
+                        pass
+
+            if conn is None:
+                try:
+                    return await aiosqlite.connect(self.path)
+                except BaseException:
+                    await self._discard(None)
+                    raise
+
+            # Validation ping; a broken connection is replaced
+            try:
+                await (await conn.execute("SELECT 1")).fetchone()
+                return conn
+            except (sqlite3.Error, ValueError):
+                await self._discard(conn)
+
+    async def release(self, conn):
+        if self.closed:
+            await self._discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except (sqlite3.Error, ValueError):
+            await self._discard(conn)
+            return
+        async with self._available:
+            self._idle.append([conn, asyncio.get_running_loop().time()])
+            self._available.notify()
+
+    async def _discard(self, conn):
+        if conn is not None:
+            try:
+                await conn.close()
+            except (sqlite3.Error, ValueError):
+                pass
+        async with self._available:
+            self._open -= 1
+            self._available.notify()
+
+    async def close_all(self):
+        # Closes idle connections now and the rest as they are released
+        self.closed = True
+        async with self._available:
+            while self._idle:
+                await self._idle.pop()[0].close()
+                self._open -= 1
+
+
+# One pool per database path, rebuilt in forked children
+_pools = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+
+def get_pool(path, **options):
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools, _pools_pid = {}, os.getpid()
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = SQLitePool(path, **options)
+        return pool
+
+
+# One async pool per database path and event loop; a closed loop's pools
+# go away with it
+_async_pools = weakref.WeakKeyDictionary()
+
+
+def get_async_pool(path, **options):
+    pools = _async_pools.setdefault(asyncio.get_running_loop(), {})
+    pool = pools.get(path)
+    if pool is None or pool.closed:
+        pool = pools[path] = AsyncSQLitePool(path, **options)
+    return pool
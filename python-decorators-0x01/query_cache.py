@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import re
+import threading
+import time
+
+from cache_backends import MemoryBackend
+
+logger = logging.getLogger('query_cache')
+
+# Tables a query reads from, and tables a statement writes to
+_READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+["`\[]?(\w+)', re.IGNORECASE)
+_WRITE_TABLE = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO'
+    r'|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+["`\[]?(\w+)',
+    re.IGNORECASE)
+
+
+def tables_in(query):
+    return {name.lower() for name in _READ_TABLES.findall(query or '')}
+
+
+def written_table(statement):
+    match = _WRITE_TABLE.match(statement or '')
+    return match.group(1).lower() if match else None
+
+
+# Normalise whitespace so formatting differences share one entry
+def make_key(query, params=None):
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    elif params is not None:
+        params = tuple(params)
+    return (" ".join((query or '').split()), params)
+
+
+# A load in progress that concurrent misses on the same key wait for
+# (async loads signal through future instead of done)
+class _Flight:
+    def __init__(self, tables, future=None):
+        self.done = threading.Event()
+        self.future = future
+        self.tables = tables
+        self.stale = False  # a table it reads was written meanwhile
+        self.value = None
+        self.error = None
+
+
+# Thread-safe cache of query results on a pluggable backend (see
+# cache_backends): the default in-process LRU is bounded by count
+# (max_entries) and approximate size (max_bytes); SharedMemoryBackend and
+# SQLiteBackend share entries between processes. Entries expire after ttl
+# seconds and are dropped when a table they read from is written through
+# transactional. get_or_load coalesces concurrent misses on one key into a
+# single load (single-flight). _lock only guards the in-flight map and the
+# counters; backend reads and writes (which for SQLiteBackend may wait on
+# another process) never hold it. A failing backend never fails the query:
+# reads degrade to misses and writes are skipped (counted in
+# backend_errors and logged).
+class QueryCache:
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300.0,
+                 backend=None):
+        self.ttl = ttl
+        self.backend = backend or MemoryBackend(max_entries, max_bytes)
+        self._flights = {}
+        self._lock = threading.RLock()
+        self._stats = dict.fromkeys(
+            ('hits', 'misses', 'invalidations', 'coalesced', 'backend_errors'), 0)
+
+    def _backend_error(self, action):
+        with self._lock:
+            self._stats['backend_errors'] += 1
+        logger.warning("Query cache %s failed", action, exc_info=True)
+
+    def _lookup(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception:
+            self._backend_error("read")
+            return False, None
+
+    def get(self, key):
+        # Returns (found, value)
+        found, value = self._lookup(key)
+        with self._lock:
+            self._stats['hits' if found else 'misses'] += 1
+        return found, value
+
+    def _store(self, key, flight, value, ttl):
+        # Caches a leader's result unless a write made it stale. A write
+        # whose invalidation lands while the store is running marks the
+        # flight, and the entry is purged again here.
+        with self._lock:
+            if flight.stale:
+                return
+        self.set(key, value, flight.tables, ttl)
+        with self._lock:
+            stale = flight.stale
+        if stale:
+            try:
+                self.backend.invalidate_tables(flight.tables)
+            except Exception:
+                self._backend_error("invalidation")
+
+    def get_or_load(self, key, loader, tables=None, ttl=None):
+        # Returns the cached value, or runs loader() once and caches its
+        # result; concurrent callers for the same key wait for that one
+        # run and share its result or exception
+        found, value = self.get(key)
+        if found:
+            return value
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                tables = frozenset(
+                    tables if tables is not None else tables_in(key[0]))
+                flight = self._flights[key] = _Flight(tables)
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self._store(key, flight, flight.value, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def get_or_load_async(self, key, loader, tables=None, ttl=None):
+        # get_or_load for coroutine loaders: concurrent misses on the same
+        # key within one event loop await a single run of loader()
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        found, value = self.get(key)
+        if found:
+            return value
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                tables = frozenset(
+                    tables if tables is not None else tables_in(key[0]))
+                flight = self._flights[flight_key] = _Flight(
+                    tables, loop.create_future())
+                # Nobody may be waiting; don't warn about an unread error
+                flight.future.add_done_callback(
+                    lambda f: f.cancelled() or f.exception())
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            # shield: a cancelled waiter must not cancel the shared load
+            return await asyncio.shield(flight.future)
+
+        try:
+            value = await loader()
+            self._store(key, flight, value, ttl)
+            flight.future.set_result(value)
+            return value
+        except BaseException as e:
+            flight.future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[flight_key]
+
+    def set(self, key, value, tables=None, ttl=None):
+        tables = frozenset(tables if tables is not None else tables_in(key[0]))
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            self.backend.set(key, value, tables, expires_at)
+        except Exception:
+            self._backend_error("store")
+
+    def invalidate_tables(self, tables):
+        tables = {table.lower() for table in tables}
+        if not tables:
+            return
+        # Loads already running may have read the old rows. Mark them
+        # before purging, so a load that finishes in between either sees
+        # the mark or stores before the purge.
+        with self._lock:
+            for flight in self._flights.values():
+                if flight.tables & tables:
+                    flight.stale = True
+        try:
+            removed = self.backend.invalidate_tables(tables)
+        except Exception:
+            # The write already committed; failing it now would not undo it
+            self._backend_error("invalidation")
+            removed = 0
+        with self._lock:
+            self._stats['invalidations'] += removed
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        stats = self.backend.stats()
+        with self._lock:
+            stats.update(self._stats)
+        return stats
+
+
+# Process-wide cache shared by cache_query and transactional
+query_cache = QueryCache()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+import atexit
+import collections
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+# Literals and IN-lists collapse so one query shape has one fingerprint
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(query):
+    query = _STRING.sub('?', query or '')
+    query = _NUMBER.sub('?', query)
+    query = _IN_LIST.sub('IN (...)', query)
+    return ' '.join(query.split())
+
+
+def params_hash(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        params = sorted(params.items())
+    return hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+
+
+# One executed query
+QueryRecord = collections.namedtuple(
+    'QueryRecord',
+    'timestamp fingerprint params_hash duration rows error slow')
+
+
+# Default sink: one JSON line per record on the "query_log" logger,
+# slow or failed queries at WARNING
+class LoggingSink:
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger('query_log')
+
+    def __call__(self, records):
+        for record in records:
+            level = logging.WARNING if record.slow or record.error else logging.INFO
+            if self.logger.isEnabledFor(level):
+                self.logger.log(level, json.dumps(record._asdict()))
+
+
+# Records queries into a fixed-size ring buffer that a background thread
+# drains into the sink every flush_interval seconds, so the query path
+# never waits on I/O. deque.append and popleft are atomic, so producers
+# take no lock; when the buffer is full the oldest records are dropped
+# (counted in dropped). Only a sample_rate fraction of queries is kept,
+# but queries slower than slow_threshold seconds and failures always are.
+# listeners (see query_stats) see every call, sampled or not.
+class QueryInstrumentation:
+    def __init__(self, enabled=True, sample_rate=1.0, slow_threshold=0.5,
+                 capacity=10000, flush_interval=1.0, sink=None):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.flush_interval = flush_interval
+        self.sink = sink or LoggingSink()
+        self.dropped = 0
+        self.listeners = []
+        self._buffer = collections.deque(maxlen=capacity)
+        self._flusher = None
+        self._flush_lock = threading.Lock()
+
+    def configure(self, **options):
+        capacity = options.pop('capacity', None)
+        for name, value in options.items():
+            if not hasattr(self, name) or name.startswith('_'):
+                raise TypeError(f"Unknown instrumentation option: {name}")
+            setattr(self, name, value)
+        if capacity is not None:
+            self._buffer = collections.deque(self._buffer, maxlen=capacity)
+
+    def add_listener(self, listener):
+        # listener(query, duration, rows, error), called on the query's
+        # thread, so it should be cheap; exceptions it raises are logged
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def record(self, query, params, duration, rows, error):
+        for listener in self.listeners:
+            try:
+                listener(query, duration, rows, error)
+            except Exception:
+                logging.getLogger('query_log').exception(
+                    "Query listener %r failed", listener)
+        slow = self.slow_threshold is not None and duration >= self.slow_threshold
+        if not (slow or error) and self.sample_rate < 1.0 \
+                and random.random() >= self.sample_rate:
+            return
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            self.dropped += 1
+        # Fingerprinting and hashing wait for the flusher thread
+        buffer.append((time.time(), query, params, duration, rows, error, slow))
+        if self._flusher is None:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self._flush_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run, name='query-log-flusher', daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        # Drains the buffer into the sink on the calling thread
+        with self._flush_lock:
+            records = []
+            try:
+                while True:
+                    records.append(self._buffer.popleft())
+            except IndexError:
+                pass
+            if records:
+                records = [
+                    QueryRecord(timestamp, fingerprint(query), params_hash(params),
+                                duration, rows,
+                                error and f"{type(error).__name__}: {error}", slow)
+                    for timestamp, query, params, duration, rows, error, slow
+                    in records]
+                try:
+                    self.sink(records)
+                except Exception:
+                    logging.getLogger('query_log').exception(
+                        "Query log sink failed; %d records lost", len(records))
+
+
+instrumentation = QueryInstrumentation()
+atexit.register(instrumentation.flush)
+
+
+def configure(**options):
+    instrumentation.configure(**options)
+
+
+# The query is the `query` keyword or the first string argument, the
+# parameters the `params` keyword or the argument after the query
+def _query_and_params(args, kwargs):
+    if 'query' in kwargs:
+        return kwargs['query'], kwargs.get('params')
+    for i, arg in enumerate(args):
+        if isinstance(arg, str):
+            params = args[i + 1] if i + 1 < len(args) else None
+            return arg, kwargs.get('params', params)
+    return '', kwargs.get('params')
+
+
+def _row_count(result):
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+# Decorator timing each call and recording it; when instrumentation is
+# disabled the only cost is one attribute check
+def instrument_query(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return await func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                query, params = _query_and_params(args, kwargs)
+                instrumentation.record(
+                    query, params, time.perf_counter() - started, None, e)
+                raise
+            query, params = _query_and_params(args, kwargs)
+            instrumentation.record(
+                query, params, time.perf_counter() - started,
+                _row_count(result), None)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not instrumentation.enabled:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            query, params = _query_and_params(args, kwargs)
+            instrumentation.record(
+                query, params, time.perf_counter() - started, None, e)
+            raise
+        query, params = _query_and_params(args, kwargs)
+        instrumentation.record(
+            query, params, time.perf_counter() - started,
+            _row_count(result), None)
+        return result
+    return wrapper
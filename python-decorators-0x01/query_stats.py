@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+import collections
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from query_instrumentation import fingerprint, instrumentation
+
+# Histogram precision: values keep their top SUB_BITS bits, so a bucket
+# is at most 1/2**(SUB_BITS-1) (~3%) wider than its lower bound
+SUB_BITS = 6
+
+# Raw calls QueryStats buffers before the query thread folds them in itself
+PENDING_LIMIT = 4096
+
+
+def _bucket(micros):
+    # Lower bound of the bucket holding an integer number of microseconds
+    shift = max(0, micros.bit_length() - SUB_BITS)
+    return micros >> shift << shift
+
+
+def _bucket_width(lower):
+    return 1 << max(0, lower.bit_length() - SUB_BITS)
+
+
+# HDR-style log-linear latency histogram: exact below 2**SUB_BITS
+# microseconds, then 2**(SUB_BITS-1) linear buckets per power of two.
+# Memory grows with the range of latencies seen, not with the call count.
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = {}  # bucket lower bound (us) -> count
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        micros = max(0, int(seconds * 1e6))
+        lower = _bucket(micros)
+        self.counts[lower] = self.counts.get(lower, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        # Latency in seconds at or below which a q fraction of calls fall
+        if not self.count:
+            return None
+        if q >= 1:
+            return self.max
+        rank = q * self.count
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= rank:
+                middle = (lower + (_bucket_width(lower) - 1) / 2) / 1e6
+                return min(max(middle, self.min), self.max)
+        return self.max
+
+
+# Counters and latency histogram for one query fingerprint
+class FingerprintStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.latency = LatencyHistogram()
+
+    def summary(self):
+        latency = self.latency
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_seconds': latency.total,
+            'mean_seconds': latency.total / latency.count if latency.count else None,
+            'max_seconds': latency.max,
+            'p50_seconds': latency.percentile(0.50),
+            'p95_seconds': latency.percentile(0.95),
+            'p99_seconds': latency.percentile(0.99),
+        }
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Thread-safe statistics per normalised query fingerprint, fed by the
+# query instrumentation (every call through log_queries, sampled or not).
+# A call only appends to a deque (atomic, no lock); fingerprinting and
+# aggregation wait for the next read, or for PENDING_LIMIT buffered calls.
+class QueryStats:
+    def __init__(self):
+        self._by_fingerprint = {}
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def __call__(self, query, duration, rows, error):
+        self._pending.append((query, duration, rows, error))
+        if len(self._pending) >= PENDING_LIMIT:
+            with self._lock:
+                self._aggregate()
+
+    def _aggregate(self):
+        # Folds the buffered calls in; the caller holds _lock
+        pending = self._pending
+        by_fingerprint = self._by_fingerprint
+        try:
+            while True:
+                query, duration, rows, error = pending.popleft()
+                key = fingerprint(query)
+                stats = by_fingerprint.get(key)
+                if stats is None:
+                    stats = by_fingerprint[key] = FingerprintStats()
+                stats.calls += 1
+                if error is not None:
+                    stats.errors += 1
+                if rows:
+                    stats.rows += rows
+                stats.latency.record(duration)
+        except IndexError:
+            pass
+
+    def attach(self, recorder=instrumentation):
+        recorder.add_listener(self)
+
+    def detach(self, recorder=instrumentation):
+        recorder.remove_listener(self)
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+            self._by_fingerprint = {}
+            self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            self._aggregate()
+            return {key: stats.summary()
+                    for key, stats in self._by_fingerprint.items()}
+
+    def top(self, n=10, by='total_seconds'):
+        # The n worst fingerprints by a summary field (total_seconds
+        # finds what costs most overall, p99_seconds the worst tails)
+        ranked = sorted(self.snapshot().items(),
+                        key=lambda item: item[1][by] or 0, reverse=True)
+        return ranked[:n]
+
+    def report(self, n=10, by='total_seconds'):
+        lines = [f"Top {n} queries by {by} since "
+                 f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))}:"]
+        for key, summary in self.top(n, by):
+            lines.append(
+                f"{summary['total_seconds']:9.3f}s total {summary['calls']:8d} calls "
+                f"p50 {summary['p50_seconds'] * 1e3:8.2f}ms "
+                f"p95 {summary['p95_seconds'] * 1e3:8.2f}ms "
+                f"p99 {summary['p99_seconds'] * 1e3:8.2f}ms "
+                f"{summary['rows']:9d} rows {summary['errors']:5d} errors  {key}")
+        return "\n".join(lines)
+
+    def to_json(self):
+        return json.dumps({'started': self.started, 'queries': self.snapshot()})
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP query_duration_seconds Query latency by fingerprint.",
+            "# TYPE query_duration_seconds summary",
+        ]
+        snapshot = self.snapshot()
+        for key, summary in snapshot.items():
+            label = f'fingerprint="{_label(key)}"'
+            for quantile, field in (('0.5', 'p50_seconds'), ('0.95', 'p95_seconds'),
+                                    ('0.99', 'p99_seconds')):
+                value = summary[field]
+                lines.append(
+                    f'query_duration_seconds{{{label},quantile="{quantile}"}} {value}')
+            lines.append(f"query_duration_seconds_sum{{{label}}} {summary['total_seconds']}")
+            lines.append(f"query_duration_seconds_count{{{label}}} {summary['calls']}")
+        for name, field, help_text in (
+                ('query_rows_total', 'rows', 'Rows returned by fingerprint.'),
+                ('query_errors_total', 'errors', 'Failed calls by fingerprint.')):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, summary in snapshot.items():
+                lines.append(f'{name}{{fingerprint="{_label(key)}"}} {summary[field]}')
+        return "\n".join(lines) + "\n"
+
+
+query_stats = QueryStats()
+
+
+# Logs query_stats.report(n) every interval seconds from a daemon thread;
+# set the returned event to stop it
+def start_reporter(interval=60.0, n=10, by='total_seconds', logger=None,
+                   stats=query_stats):
+    logger = logger or logging.getLogger('query_stats')
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            logger.info(stats.report(n, by))
+
+    threading.Thread(target=run, name='query-stats-reporter', daemon=True).start()
+    return stop
+
+
+# Serves /metrics (Prometheus text) and /stats.json from a daemon thread;
+# call shutdown() on the returned server to stop it
+def serve(port=9108, host='127.0.0.1', stats=query_stats):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = stats.to_prometheus().encode()
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/stats.json':
+                body = stats.to_json().encode()
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='query-stats-http',
+                     daemon=True).start()
+    return server
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+
+# sqlite3 errors worth retrying, matched on the message
+_TRANSIENT_MESSAGES = (
+    'database is locked', 'database table is locked', 'database is busy',
+    'disk i/o error', 'unable to open database file',
+)
+
+# MySQL error numbers worth retrying: lock wait timeout, deadlock,
+# too many connections, can't connect, server gone away, lost connection
+_TRANSIENT_ERRNOS = {1040, 1205, 1213, 2002, 2003, 2006, 2013, 2055}
+
+
+# Raised instead of calling the database while the breaker is open
+class CircuitOpenError(sqlite3.OperationalError):
+    pass
+
+
+# True for errors a later attempt can get past (locks, busy, lost
+# connections); syntax errors, constraint violations and the like are not
+def is_retryable(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if getattr(error, 'errno', None) in _TRANSIENT_ERRNOS:
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return any(text in message for text in _TRANSIENT_MESSAGES)
+    return False
+
+
+# Shared circuit breaker. After failure_threshold transient failures in a
+# row it opens and calls fail fast with CircuitOpenError; after
+# reset_timeout seconds one trial call is let through (half-open), which
+# closes the breaker on success and reopens it on failure.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False  # a half-open trial call is in progress
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit open: database unavailable")
+                self.state = 'half_open'
+                self._trial = False
+            if self._trial:
+                raise CircuitOpenError("Circuit half-open: trial call running")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        # The trial call ended without telling us anything (cancelled)
+        with self._lock:
+            self._trial = False
+
+    def reset(self):
+        self.record_success()
+
+
+# Counters across every call made through a RetryPolicy
+class RetryStats:
+    FIELDS = ('calls', 'attempts', 'retries', 'successes', 'failures',
+              'not_retryable', 'exhausted', 'deadline_exceeded',
+              'short_circuited')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field):
+        with self._lock:
+            self._counts[field] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
+
+
+retry_stats = RetryStats()
+circuit_breaker = CircuitBreaker()
+
+
+# Retries transient failures up to `retries` attempts in total, sleeping a
+# random delay in [0, min(max_delay, base_delay * 2**n)] before retry n
+# ("full jitter", so workers that failed together don't retry together).
+# No retry starts once `deadline` seconds have passed since the first
+# attempt. breaker and stats default to the module-wide shared ones;
+# pass breaker=False to run without one.
+class RetryPolicy:
+    def __init__(self, retries=3, base_delay=0.1, max_delay=5.0, deadline=None,
+                 retryable=is_retryable, breaker=None, stats=None):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retryable = retryable
+        self.breaker = circuit_breaker if breaker is None else breaker
+        self.stats = stats or retry_stats
+
+    def backoff(self, attempt):
+        # Delay before the retry that follows failed attempt number `attempt`
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _before_attempt(self):
+        self.stats.incr('attempts')
+        if self.breaker:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self.stats.incr('short_circuited')
+                raise
+
+    def _succeeded(self):
+        if self.breaker:
+            self.breaker.record_success()
+        self.stats.incr('successes')
+
+    def _next_delay(self, error, attempt, started):
+        # Returns how long to wait before retrying, or None to give up
+        retryable = self.retryable(error)
+        if self.breaker:
+            # Any other error still means the database answered
+            if retryable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        if not retryable:
+            self.stats.incr('not_retryable')
+        elif attempt >= self.retries:
+            self.stats.incr('exhausted')
+        else:
+            delay = self.backoff(attempt)
+            if self.deadline is None or \
+                    time.monotonic() + delay - started < self.deadline:
+                self.stats.incr('retries')
+                return delay
+            self.stats.incr('deadline_exceeded')
+        self.stats.incr('failures')
+        return None
+
+    def call(self, func, *args, **kwargs):
+        self.stats.incr('calls')
+        started = time.monotonic()
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._before_attempt()
+                result = func(*args, **kwargs)
+            except CircuitOpenError:
+                self.stats.incr('failures')
+                raise
+            except Exception as e:
+                delay = self._next_delay(e, attempt, started)
+                if delay is None:
+                    raise
+                print(f"Attempt {attempt} failed: {e}; retrying in {delay:.2f}s")
+                time.sleep(delay)
+            except BaseException:
+                if self.breaker:
+                    self.breaker.release_trial()
+                raise
+            else:
+                self._succeeded()
+                return result
+
+    async def call_async(self, func, *args, **kwargs):
+        self.stats.incr('calls')
+        started = time.monotonic()
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._before_attempt()
+                result = await func(*args, **kwargs)
+            except CircuitOpenError:
+                self.stats.incr('failures')
+                raise
+            except Exception as e:
+                delay = self._next_delay(e, attempt, started)
+                if delay is None:
+                    raise
+                print(f"Attempt {attempt} failed: {e}; retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            except BaseException:
+                if self.breaker:
+                    self.breaker.release_trial()
+                raise
+            else:
+                self._succeeded()
+                return result
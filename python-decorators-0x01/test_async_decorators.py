@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Unit tests for the async side of the DB decorators.
+
+This module contains tests for:
+- `AsyncSQLitePool`: reuse, checkout limits, rollback and shutdown
+- `with_pooled_connection`: the process exits after asyncio.run
+- `transactional`: commit, rollback and cache invalidation when async
+- `retry_on_failure`: retrying coroutines
+"""
+
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest.mock import patch
+
+from connection_pool import AsyncSQLitePool, PoolTimeout, get_async_pool
+from query_cache import QueryCache, make_key
+from retry_policy import RetryPolicy, RetryStats
+
+transactional_module = __import__('2-transactional')
+retry_module = __import__('3-retry_on_failure')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class ScratchDatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """Base class running each test against a scratch users.db."""
+
+    def setUp(self):
+        """Run each test in a temporary directory with three users."""
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(workdir.name)
+        self.addCleanup(os.chdir, cwd)
+        conn = sqlite3.connect("users.db")
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+        conn.executemany("INSERT INTO users VALUES (?, ?)",
+                         ((i, f"old{i}") for i in range(1, 4)))
+        conn.commit()
+        conn.close()
+
+    def emails(self):
+        conn = sqlite3.connect("users.db")
+        try:
+            return [row[0] for row in
+                    conn.execute("SELECT email FROM users ORDER BY id")]
+        finally:
+            conn.close()
+
+
+class TestAsyncSQLitePool(ScratchDatabaseTestCase):
+    """Tests for AsyncSQLitePool."""
+
+    async def test_reuses_connections(self):
+        """Test a released connection is handed out again."""
+        async with AsyncSQLitePool("users.db") as pool:
+            conn = await pool.acquire()
+            await pool.release(conn)
+            self.assertIs(await pool.acquire(), conn)
+            await pool.release(conn)
+
+    async def test_checkout_waits_then_times_out(self):
+        """Test a full pool makes callers wait and finally time out."""
+        async with AsyncSQLitePool("users.db", max_size=1, timeout=0.1) as pool:
+            conn = await pool.acquire()
+            with self.assertRaises(PoolTimeout):
+                await pool.acquire()
+
+            waiter = asyncio.ensure_future(pool.acquire(timeout=5))
+            await asyncio.sleep(0.05)
+            await pool.release(conn)
+            self.assertIs(await waiter, conn)
+            await pool.release(conn)
+
+    async def test_release_rolls_back(self):
+        """Test work left uncommitted is rolled back on release."""
+        async with AsyncSQLitePool("users.db") as pool:
+            conn = await pool.acquire()
+            await conn.execute("UPDATE users SET email = 'x' WHERE id = 1")
+            await pool.release(conn)
+        self.assertEqual(self.emails()[0], "old1")
+
+    async def test_closed_pool(self):
+        """Test close_all closes idle and later-released connections."""
+        pool = AsyncSQLitePool("users.db")
+        idle, busy = await pool.acquire(), await pool.acquire()
+        await pool.release(idle)
+        await pool.close_all()
+        await pool.release(busy)
+        self.assertEqual(pool._open, 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            await pool.acquire()
+        self.assertIsNot(get_async_pool("users.db"), pool)
+        await get_async_pool("users.db").close_all()
+
+
+class TestProcessExit(unittest.TestCase):
+    """The pool must not keep the interpreter alive."""
+
+    def test_process_exits_after_asyncio_run(self):
+        """Test a pooled async call under asyncio.run lets Python exit."""
+        script = textwrap.dedent(f"""
+            import asyncio, sqlite3, sys
+            sys.path.insert(0, {HERE!r})
+            sqlite3.connect("users.db").execute("CREATE TABLE users (id)")
+            with_db = __import__('1-with_db_connection')
+
+            @with_db.with_pooled_connection
+            async def count(conn):
+                async with conn.execute("SELECT count(*) FROM users") as cursor:
+                    return (await cursor.fetchone())[0]
+
+            print(asyncio.run(count()), asyncio.run(count()))
+        """)
+        with tempfile.TemporaryDirectory() as workdir:
+            result = subprocess.run([sys.executable, "-c", script], cwd=workdir,
+                                    capture_output=True, text=True, timeout=30)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "0 0")
+
+
+class TestAsyncTransactional(ScratchDatabaseTestCase):
+    """Tests for transactional on coroutines."""
+
+    def setUp(self):
+        """Give each test a fresh query cache."""
+        super().setUp()
+        self.cache = QueryCache()
+        patcher = patch.object(transactional_module, "query_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_commits_and_invalidates(self):
+        """Test a successful call commits and drops cached users queries."""
+        key = make_key("SELECT * FROM users")
+        self.cache.set(key, ["stale"], tables={"users"})
+
+        @transactional_module.with_db_connection
+        @transactional_module.transactional
+        async def set_email(conn, user_id, email):
+            await conn.execute("UPDATE users SET email = ? WHERE id = ?",
+                               (email, user_id))
+
+        await set_email(1, "new1")
+        self.assertEqual(self.emails()[0], "new1")
+        self.assertEqual(self.cache.get(key), (False, None))
+
+    async def test_rolls_back_on_error(self):
+        """Test a failing call leaves the database unchanged."""
+        @transactional_module.with_db_connection
+        @transactional_module.transactional
+        async def set_email(conn, user_id, email):
+            await conn.execute("UPDATE users SET email = ? WHERE id = ?",
+                               (email, user_id))
+            raise ValueError("invalid email")
+
+        with self.assertRaises(ValueError):
+            await set_email(1, "new1")
+        self.assertEqual(self.emails()[0], "old1")
+
+
+class TestAsyncRetry(unittest.IsolatedAsyncioTestCase):
+    """Tests for retry_on_failure on coroutines."""
+
+    def setUp(self):
+        """Silence retry messages and skip real sleeping."""
+        async def no_sleep(delay):
+            pass
+        for patcher in (patch("retry_policy.asyncio.sleep", no_sleep),
+                        patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.policy = RetryPolicy(retries=3, breaker=False, stats=RetryStats())
+
+    async def test_retries_transient_errors(self):
+        """Test a locked database is retried until the call succeeds."""
+        calls = []
+
+        @retry_module.retry_on_failure(policy=self.policy)
+        async def fetch():
+            calls.append(1)
+            if len(calls) < 3:
+                raise sqlite3.OperationalError("database is locked")
+            return "ok"
+
+        self.assertEqual(await fetch(), "ok")
+        self.assertEqual(len(calls), 3)
+
+    async def test_permanent_error_is_not_retried(self):
+        """Test a syntax error is raised on the first attempt."""
+        calls = []
+
+        @retry_module.retry_on_failure(policy=self.policy)
+        async def fetch():
+            calls.append(1)
+            raise sqlite3.OperationalError('near "SELEC": syntax error')
+
+        with self.assertRaises(sqlite3.OperationalError):
+            await fetch()
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Unit tests for batched and bulk write transactions.
+
+This module contains tests for:
+- `batch_transactions`: grouping transactional calls into shared commits,
+  per-item savepoints, rollback of pending work on error, and use as a
+  decorator from several threads
+- `update_user_emails`: chunked executemany and temp-table join updates
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+transactional_module = __import__('2-transactional')
+batch_transactions = transactional_module.batch_transactions
+transactional = transactional_module.transactional
+with_db_connection = transactional_module.with_db_connection
+update_user_emails = transactional_module.update_user_emails
+
+
+@with_db_connection
+@transactional
+def set_email(conn, user_id, email):
+    conn.execute("UPDATE users SET email = ? WHERE id = ?", (email, user_id))
+    if email == "invalid":
+        raise ValueError("invalid email")
+
+
+class ScratchDatabaseTestCase(unittest.TestCase):
+    """Base class running each test against a scratch users.db."""
+
+    def setUp(self):
+        """Run each test in a temporary directory with ten users."""
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(workdir.name)
+        self.addCleanup(os.chdir, cwd)
+        conn = sqlite3.connect("users.db")
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+        conn.executemany("INSERT INTO users VALUES (?, ?)",
+                         ((i, f"old{i}") for i in range(1, 11)))
+        conn.commit()
+        conn.close()
+
+    def emails(self):
+        conn = sqlite3.connect("users.db")
+        try:
+            return [row[0] for row in
+                    conn.execute("SELECT email FROM users ORDER BY id")]
+        finally:
+            conn.close()
+
+
+class TestBatchTransactions(ScratchDatabaseTestCase):
+    """Tests for batch_transactions."""
+
+    def test_commits_every_n_operations(self):
+        """Test calls are committed in groups of `every`."""
+        with batch_transactions(every=4) as batch:
+            for user_id in range(1, 11):
+                set_email(user_id, f"new{user_id}")
+        self.assertEqual(batch.commits, 3)
+        self.assertEqual(batch.committed, 10)
+        self.assertEqual(self.emails(), [f"new{i}" for i in range(1, 11)])
+
+    def test_uncommitted_work_is_not_visible(self):
+        """Test other connections only see work once a group commits."""
+        with batch_transactions(every=3):
+            set_email(1, "new1")
+            self.assertEqual(self.emails()[0], "old1")
+            set_email(2, "new2")
+            set_email(3, "new3")
+            self.assertEqual(self.emails()[:3], ["new1", "new2", "new3"])
+
+    def test_failed_item_rolls_back_alone(self):
+        """Test a failing call is undone while the rest of the batch commits."""
+        with batch_transactions(every=100) as batch:
+            set_email(1, "new1")
+            with self.assertRaises(ValueError):
+                set_email(2, "invalid")
+            set_email(3, "new3")
+        self.assertEqual(batch.failed, 1)
+        self.assertEqual(self.emails()[:3], ["new1", "old2", "new3"])
+
+    def test_error_in_block_rolls_back_pending(self):
+        """Test pending operations roll back if the block raises."""
+        with self.assertRaises(KeyError):
+            with batch_transactions(every=2):
+                for user_id in range(1, 4):
+                    set_email(user_id, f"new{user_id}")
+                raise KeyError("stop")
+        self.assertEqual(self.emails()[:3], ["new1", "new2", "old3"])
+
+    def test_interval_commits(self):
+        """Test interval_ms=0 commits after every operation."""
+        with batch_transactions(every=100, interval_ms=0) as batch:
+            set_email(1, "new1")
+            set_email(2, "new2")
+        self.assertEqual(batch.commits, 2)
+
+    def test_outside_batch_commits_per_call(self):
+        """Test calls outside a batch still commit on their own."""
+        set_email(1, "new1")
+        self.assertEqual(self.emails()[0], "new1")
+
+    def test_decorator_gives_each_thread_its_own_batch(self):
+        """Test concurrent calls of a decorated function don't share one
+        connection."""
+        @batch_transactions(every=10)
+        def update_all(prefix):
+            for round_ in range(10):
+                for user_id in range(1, 11):
+                    set_email(user_id, f"{prefix}{round_}-{user_id}")
+
+        errors = []
+
+        def run(prefix):
+            try:
+                update_all(prefix)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run, args=(prefix,))
+                   for prefix in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(all(email[0] in "ab" and email.endswith(f"9-{i}")
+                            for i, email in enumerate(self.emails(), 1)))
+
+
+
+class TestUpdateUserEmails(ScratchDatabaseTestCase):
+    """Tests for the bulk update helper."""
+
+    def test_methods_update_all_pairs(self):
+        """Test both methods apply every pair across chunk boundaries."""
+        for method in ("executemany", "join"):
+            with self.subTest(method=method):
+                report = update_user_emails(
+                    ((i, f"{method}{i}") for i in range(1, 11)),
+                    chunk_size=3, method=method)
+                self.assertEqual(report["rows"], 10)
+                self.assertGreater(report["rows_per_sec"], 0)
+                self.assertEqual(self.emails(),
+                                 [f"{method}{i}" for i in range(1, 11)])
+
+    def test_last_pair_wins(self):
+        """Test repeated user ids end with the last email given."""
+        for method in ("executemany", "join"):
+            with self.subTest(method=method):
+                update_user_emails([(1, "first"), (1, "last")], method=method)
+                self.assertEqual(self.emails()[0], "last")
+
+    def test_failure_rolls_back_everything(self):
+        """Test a bad pair undoes the whole bulk update."""
+        def pairs():
+            yield 1, "new1"
+            raise RuntimeError("source failed")
+
+        with self.assertRaises(RuntimeError):
+            update_user_emails(pairs(), chunk_size=1)
+        self.assertEqual(self.emails()[0], "old1")
+
+    def test_inside_batch(self):
+        """Test the helper joins an enclosing batch transaction."""
+        with batch_transactions(every=100) as batch:
+            update_user_emails([(1, "new1"), (2, "new2")])
+        self.assertEqual(batch.commits, 1)
+        self.assertEqual(self.emails()[:2], ["new1", "new2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Unit tests for the query cache storage backends.
+
+This module contains tests for:
+- `encode_value` / `decode_value`: round trips of result sets
+- `MemoryBackend`, `SharedMemoryBackend`, `SQLiteBackend`: hits, TTL,
+  table invalidation and eviction
+- sharing entries between processes, and a backend inherited across fork
+- `QueryCache`: backend failures degrade to misses and skipped stores
+"""
+
+import fcntl
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from cache_backends import (MemoryBackend, SharedMemoryBackend, SQLiteBackend,
+                            decode_value, encode_value)
+from query_cache import QueryCache, make_key
+
+USERS = make_key("SELECT * FROM users")
+ORDERS = make_key("SELECT * FROM orders")
+ROWS = [(1, "Alice", "alice@example.com", 31), (2, "Bob", None, 45)]
+LATER = time.time() + 3600
+
+
+def open_backend(kind, path):
+    """Open a backend of the given kind on path (unused for memory)."""
+    if kind == "shared":
+        return SharedMemoryBackend(path, slots=64, slot_size=1024)
+    if kind == "sqlite":
+        return SQLiteBackend(path, max_entries=100)
+    return MemoryBackend()
+
+
+def child_set(kind, path, key, value):
+    """Store value under key from another process."""
+    open_backend(kind, path).set(key, value, frozenset({"users"}), LATER)
+
+
+def child_get(kind, path, key, results):
+    """Look key up from another process."""
+    results.put(open_backend(kind, path).get(key))
+
+
+def child_write_waits(backend):
+    """Exit 0 if a write through an inherited backend waits for the
+    parent's lock."""
+    writer = threading.Thread(target=backend.set, daemon=True,
+                              args=(USERS, ROWS, frozenset({"users"}), LATER))
+    writer.start()
+    writer.join(0.5)
+    os._exit(0 if writer.is_alive() else 1)
+
+
+class TestSerialization(unittest.TestCase):
+    """Tests for encode_value and decode_value."""
+
+    def test_round_trips(self):
+        """Test each value type decodes to an equal value."""
+        values = [
+            ROWS,
+            [(1, 2.5), (-2 ** 40, 3.0)],
+            [(1, 2), (3, 4, 5)],           # ragged rows
+            [(10 ** 30, "big")],           # int wider than 64 bits
+            [(), ()],
+            [],
+            [{"id": 1, "name": "Alice"}],
+            ("not", "a", "list"),
+            {"nested": [1, (2, 3)]},
+            None,
+        ]
+        for value in values:
+            with self.subTest(value=value):
+                self.assertEqual(decode_value(encode_value(value)), value)
+
+    def test_rows_use_columnar_format(self):
+        """Test uniform tuple rows take the compact row format."""
+        self.assertEqual(encode_value(ROWS)[:1], b"R")
+
+    def test_unsupported_value_raises_type_error(self):
+        """Test a value nothing can serialise raises TypeError."""
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT 1 AS id").fetchone()
+        with self.assertRaises(TypeError):
+            encode_value([row])
+
+    def test_unknown_format(self):
+        """Test unknown blobs are rejected."""
+        with self.assertRaises(ValueError):
+            decode_value(b"Xgarbage")
+
+
+class BackendTests:
+    """Behaviour every backend shares; mixed into one case per backend."""
+
+    kind = None
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, "cache")
+        self.backend = open_backend(self.kind, self.path)
+
+    def test_set_and_get(self):
+        """Test a stored value is returned."""
+        self.assertEqual(self.backend.get(USERS), (False, None))
+        self.backend.set(USERS, ROWS, frozenset({"users"}), LATER)
+        self.assertEqual(self.backend.get(USERS), (True, ROWS))
+
+    def test_expired_entries_miss(self):
+        """Test an entry past its expiry is a miss."""
+        self.backend.set(USERS, ROWS, frozenset({"users"}), time.time() - 1)
+        self.assertEqual(self.backend.get(USERS), (False, None))
+        self.assertEqual(self.backend.stats()["expirations"], 1)
+
+    def test_invalidate_tables(self):
+        """Test invalidation drops only entries reading those tables."""
+        self.backend.set(USERS, ROWS, frozenset({"users"}), LATER)
+        self.backend.set(ORDERS, [(1,)], frozenset({"orders"}), LATER)
+        self.assertEqual(self.backend.invalidate_tables({"users"}), 1)
+        self.assertEqual(self.backend.get(USERS), (False, None))
+        self.assertEqual(self.backend.get(ORDERS), (True, [(1,)]))
+
+    def test_clear(self):
+        """Test clear drops everything."""
+        self.backend.set(USERS, ROWS, frozenset({"users"}), LATER)
+        self.backend.clear()
+        self.assertEqual(self.backend.get(USERS), (False, None))
+        self.assertEqual(self.backend.stats()["entries"], 0)
+
+
+class CrossProcessTests(BackendTests):
+    """Behaviour of backends shared between processes."""
+
+    def run_child(self, target, *args):
+        process = multiprocessing.get_context("fork").Process(
+            target=target, args=(self.kind, self.path) + args)
+        process.start()
+        process.join(30)
+        self.assertEqual(process.exitcode, 0)
+
+    def test_entry_written_by_another_process(self):
+        """Test a value stored by a child process is read here."""
+        self.run_child(child_set, USERS, ROWS)
+        self.assertEqual(self.backend.get(USERS), (True, ROWS))
+
+    def test_invalidation_seen_by_another_process(self):
+        """Test invalidating here drops the entry for other processes."""
+        self.backend.set(USERS, ROWS, frozenset({"users"}), LATER)
+        self.backend.invalidate_tables({"users"})
+        results = multiprocessing.get_context("fork").Queue()
+        self.run_child(child_get, USERS, results)
+        self.assertEqual(results.get(timeout=5), (False, None))
+
+
+class TestMemoryBackend(BackendTests, unittest.TestCase):
+    """Tests for MemoryBackend."""
+
+    kind = "memory"
+
+    def test_evicts_least_recently_used(self):
+        """Test the entry-count bound evicts the least recently used."""
+        backend = MemoryBackend(max_entries=2)
+        for i in range(2):
+            backend.set(make_key("q", (i,)), [(i,)], frozenset(), LATER)
+        backend.get(make_key("q", (0,)))
+        backend.set(make_key("q", (2,)), [(2,)], frozenset(), LATER)
+        self.assertIn(make_key("q", (0,)), backend)
+        self.assertNotIn(make_key("q", (1,)), backend)
+        self.assertEqual(backend.stats()["evictions"], 1)
+
+    def test_byte_bound(self):
+        """Test entries are evicted to stay under max_bytes."""
+        backend = MemoryBackend(max_bytes=2000)
+        for i in range(20):
+            backend.set(make_key("q", (i,)), [("x" * 100,)], frozenset(), LATER)
+        self.assertLessEqual(backend.stats()["bytes"], 2000)
+        self.assertGreater(backend.stats()["evictions"], 0)
+
+
+class TestSharedMemoryBackend(CrossProcessTests, unittest.TestCase):
+    """Tests for SharedMemoryBackend."""
+
+    kind = "shared"
+
+    def tearDown(self):
+        self.backend.close()
+
+    def test_colliding_key_replaces_slot(self):
+        """Test a key hashing to an occupied slot evicts its entry."""
+        backend = SharedMemoryBackend(self.path + "-one", slots=1, slot_size=1024)
+        self.addCleanup(backend.close)
+        backend.set(USERS, ROWS, frozenset({"users"}), LATER)
+        backend.set(ORDERS, [(1,)], frozenset({"orders"}), LATER)
+        self.assertEqual(backend.get(USERS), (False, None))
+        self.assertEqual(backend.get(ORDERS), (True, [(1,)]))
+        self.assertEqual(backend.stats()["evictions"], 1)
+
+    def test_oversized_value_is_skipped(self):
+        """Test a value larger than a slot is not stored."""
+        self.backend.set(USERS, [("x" * 5000,)], frozenset({"users"}), LATER)
+        self.assertEqual(self.backend.get(USERS), (False, None))
+
+    def test_inherited_backend_takes_its_own_lock(self):
+        """Test a backend opened before a fork still excludes the parent."""
+        fcntl.flock(self.backend._file, fcntl.LOCK_EX)
+        try:
+            process = multiprocessing.get_context("fork").Process(
+                target=child_write_waits, args=(self.backend,))
+            process.start()
+            process.join(30)
+        finally:
+            fcntl.flock(self.backend._file, fcntl.LOCK_UN)
+        self.assertEqual(process.exitcode, 0)
+
+    def test_reopen_keeps_layout(self):
+        """Test reopening an existing file keeps its slots and entries."""
+        self.backend.set(USERS, ROWS, frozenset({"users"}), LATER)
+        again = SharedMemoryBackend(self.path, slots=8, slot_size=256)
+        self.addCleanup(again.close)
+        self.assertEqual((again.slots, again.slot_size), (64, 1024))
+        self.assertEqual(again.get(USERS), (True, ROWS))
+
+
+class TestSQLiteBackend(CrossProcessTests, unittest.TestCase):
+    """Tests for SQLiteBackend."""
+
+    kind = "sqlite"
+
+    def test_survives_reopen(self):
+        """Test entries persist in the file."""
+        self.backend.set(USERS, ROWS, frozenset({"users"}), LATER)
+        self.assertEqual(SQLiteBackend(self.path).get(USERS), (True, ROWS))
+
+    def test_evicts_least_recently_used(self):
+        """Test hits count as use when choosing what to evict."""
+        backend = SQLiteBackend(self.path + "-lru", max_entries=2)
+        for i in range(2):
+            backend.set(make_key("q", (i,)), [(i,)], frozenset(), LATER)
+            time.sleep(0.01)
+        backend.get(make_key("q", (0,)))
+        backend.set(make_key("q", (2,)), [(2,)], frozenset(), LATER)
+        self.assertEqual(backend.get(make_key("q", (0,))), (True, [(0,)]))
+        self.assertEqual(backend.get(make_key("q", (1,))), (False, None))
+        self.assertEqual(backend.stats()["evictions"], 1)
+
+    def test_hit_while_another_process_writes(self):
+        """Test reads do not wait on a writer holding the database."""
+        self.backend.set(USERS, ROWS, frozenset({"users"}), LATER)
+        writer = sqlite3.connect(self.path)
+        writer.execute("BEGIN IMMEDIATE")
+        try:
+            started = time.monotonic()
+            self.assertEqual(self.backend.get(USERS), (True, ROWS))
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.rollback()
+            writer.close()
+
+
+class TestBackendFailures(unittest.TestCase):
+    """A failing backend must never fail the query."""
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.dir = workdir.name
+        patcher = patch("query_cache.logger")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sqlite_rows(self):
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        return conn.execute("SELECT 1 AS id").fetchall()
+
+    def test_unserialisable_result_is_returned_uncached(self):
+        """Test sqlite3.Row results load fine but are not stored."""
+        for backend in (SharedMemoryBackend(os.path.join(self.dir, "shm")),
+                        SQLiteBackend(os.path.join(self.dir, "db"))):
+            with self.subTest(backend=type(backend).__name__):
+                cache = QueryCache(backend=backend)
+                rows = self.sqlite_rows()
+                self.assertIs(cache.get_or_load(USERS, lambda: rows), rows)
+                self.assertEqual(cache.get(USERS), (False, None))
+                self.assertEqual(cache.stats()["backend_errors"], 1)
+
+    def test_locked_sqlite_store_is_skipped(self):
+        """Test a store that cannot get the write lock is skipped."""
+        path = os.path.join(self.dir, "db")
+        backend = SQLiteBackend(path)
+        writer = sqlite3.connect(path)
+        writer.execute("BEGIN IMMEDIATE")
+        self.addCleanup(writer.close)
+        with patch.object(backend, "_conn",
+                          lambda: sqlite3.connect(path, timeout=0.01)):
+            cache = QueryCache(backend=backend)
+            self.assertEqual(cache.get_or_load(USERS, lambda: ROWS), ROWS)
+        self.assertEqual(cache.stats()["backend_errors"], 1)
+
+    def test_read_and_invalidation_errors(self):
+        """Test read errors become misses and invalidation errors are logged."""
+        cache = QueryCache()
+        with patch.object(cache.backend, "get", side_effect=OSError("gone")), \
+                patch.object(cache.backend, "invalidate_tables",
+                             side_effect=OSError("gone")):
+            self.assertEqual(cache.get(USERS), (False, None))
+            self.assertEqual(cache.get_or_load(USERS, lambda: ROWS), ROWS)
+            cache.invalidate_tables({"users"})
+        self.assertEqual(cache.stats()["backend_errors"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Thread-safety stress tests for the query cache.
+
+This module contains tests for:
+- `QueryCache.get_or_load`: single-flight loading of concurrent misses,
+  invalidation races, backend I/O outside the lock
+- `QueryCache.get_or_load_async`: single-flight loading across tasks
+- `cache_query`: one execution per key under a thundering herd, one
+  lookup per call
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from query_cache import QueryCache, make_key
+
+cache_query_module = __import__('4-cache_query')
+
+THREADS = 64
+
+
+def run_together(target, threads=THREADS):
+    """Starts `threads` threads on target at the same instant and joins
+    them, returning what each one returned or raised."""
+    barrier = threading.Barrier(threads)
+    outcomes = [None] * threads
+
+    def run(index):
+        barrier.wait()
+        try:
+            outcomes[index] = target()
+        except Exception as error:
+            outcomes[index] = error
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return outcomes
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Tests for QueryCache.get_or_load under concurrency."""
+
+    def setUp(self):
+        """Give every test a fresh cache."""
+        self.cache = QueryCache()
+        self.key = make_key("SELECT * FROM users WHERE id = ?", (1,))
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def slow_loader(self, result=None, error=None):
+        """Return a loader that counts its calls and takes a while."""
+        def load():
+            with self.calls_lock:
+                self.calls += 1
+            time.sleep(0.05)
+            if error is not None:
+                raise error
+            return result
+        return load
+
+    def test_concurrent_misses_load_once(self):
+        """Test concurrent misses on one key share a single load."""
+        rows = [(1, "Alice")]
+        outcomes = run_together(
+            lambda: self.cache.get_or_load(self.key, self.slow_loader(rows)))
+        self.assertEqual(self.calls, 1)
+        for outcome in outcomes:
+            self.assertIs(outcome, rows)
+        self.assertEqual(self.cache.stats()['coalesced'], THREADS - 1)
+        self.assertEqual(self.cache.get(self.key), (True, rows))
+
+    def test_distinct_keys_load_independently(self):
+        """Test each key gets its own load."""
+        counter = iter(range(THREADS))
+        lock = threading.Lock()
+
+        def target():
+            with lock:
+                user_id = next(counter) % 4
+            key = make_key("SELECT * FROM users WHERE id = ?", (user_id,))
+            return self.cache.get_or_load(key, self.slow_loader(user_id))
+
+        outcomes = run_together(target)
+        self.assertEqual(self.calls, 4)
+        self.assertEqual(sorted(set(outcomes)), [0, 1, 2, 3])
+
+    def test_error_is_shared_and_not_cached(self):
+        """Test waiters see the leader's error and the next call retries."""
+        error = RuntimeError("database is locked")
+        outcomes = run_together(lambda: self.cache.get_or_load(
+            self.key, self.slow_loader(error=error)))
+        self.assertEqual(self.calls, 1)
+        for outcome in outcomes:
+            self.assertIs(outcome, error)
+        self.assertEqual(self.cache.get(self.key), (False, None))
+
+        self.cache.get_or_load(self.key, self.slow_loader(["fresh"]))
+        self.assertEqual(self.calls, 2)
+
+    def test_invalidation_during_load_is_not_cached(self):
+        """Test a result loaded across a write to its table is dropped."""
+        def load():
+            self.cache.invalidate_tables({"users"})
+            return ["stale"]
+
+        self.assertEqual(self.cache.get_or_load(self.key, load), ["stale"])
+        self.assertEqual(self.cache.get(self.key), (False, None))
+
+    def test_load_finishing_during_purge_is_not_cached(self):
+        """Test a load that completes while the backend is being purged
+        does not store the rows read before the write."""
+        loading = threading.Event()
+        release = threading.Event()
+
+        def load():
+            loading.set()
+            release.wait()
+            return "OLD ROWS"
+
+        leader = threading.Thread(
+            target=self.cache.get_or_load, args=(self.key, load))
+        leader.start()
+        loading.wait()
+        purge = self.cache.backend.invalidate_tables
+
+        def purge_then_finish_load(tables):
+            removed = purge(tables)
+            release.set()
+            leader.join()
+            return removed
+
+        with patch.object(self.cache.backend, "invalidate_tables",
+                          purge_then_finish_load):
+            self.cache.invalidate_tables({"users"})
+        self.assertEqual(self.cache.get(self.key), (False, None))
+
+    def test_invalidation_during_store_is_purged(self):
+        """Test a write invalidated while its stale result was being stored
+        leaves nothing cached."""
+        store = self.cache.backend.set
+
+        def invalidate_then_store(*args):
+            self.cache.invalidate_tables({"users"})
+            store(*args)
+
+        with patch.object(self.cache.backend, "set", invalidate_then_store):
+            self.cache.get_or_load(self.key, lambda: "OLD ROWS")
+        self.assertEqual(self.cache.get(self.key), (False, None))
+
+    def test_slow_store_does_not_block_lookups(self):
+        """Test lookups of other keys proceed while a store is waiting."""
+        other = make_key("SELECT * FROM posts", None)
+        self.cache.set(other, ["post"])
+        storing = threading.Event()
+        release = threading.Event()
+        store = self.cache.backend.set
+
+        def slow_store(*args):
+            storing.set()
+            release.wait()
+            store(*args)
+
+        with patch.object(self.cache.backend, "set", slow_store):
+            leader = threading.Thread(target=self.cache.get_or_load,
+                                      args=(self.key, lambda: ["user"]))
+            leader.start()
+            storing.wait()
+            looked_up = []
+            reader = threading.Thread(target=lambda: looked_up.append(
+                self.cache.get_or_load(other, self.slow_loader())))
+            reader.start()
+            reader.join(timeout=2)
+            blocked = reader.is_alive()
+            release.set()
+            leader.join()
+            reader.join()
+        self.assertFalse(blocked)
+        self.assertEqual(looked_up, [["post"]])
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(self.cache.get(self.key), (True, ["user"]))
+
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Tests for QueryCache.get_or_load_async under concurrency."""
+
+    async def test_concurrent_tasks_load_once(self):
+        """Test concurrent tasks missing one key share a single load."""
+        cache = QueryCache()
+        key = make_key("SELECT * FROM users WHERE id = ?", (1,))
+        calls = []
+        rows = [(1, "Alice")]
+
+        async def load():
+            calls.append(key)
+            await asyncio.sleep(0.05)
+            return rows
+
+        outcomes = await asyncio.gather(
+            *[cache.get_or_load_async(key, load) for _ in range(THREADS)])
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(outcome is rows for outcome in outcomes))
+        self.assertEqual(cache.get(key), (True, rows))
+
+    async def test_error_is_shared_and_not_cached(self):
+        """Test waiting tasks see the leader's error."""
+        cache = QueryCache()
+        key = make_key("SELECT * FROM users", None)
+        error = RuntimeError("database is locked")
+
+        async def load():
+            await asyncio.sleep(0.05)
+            raise error
+
+        outcomes = await asyncio.gather(
+            *[cache.get_or_load_async(key, load) for _ in range(8)],
+            return_exceptions=True)
+        self.assertTrue(all(outcome is error for outcome in outcomes))
+        self.assertEqual(cache.get(key), (False, None))
+
+
+class TestCacheQueryDecorator(unittest.TestCase):
+    """Stress test for the cache_query decorator."""
+
+    def test_thundering_herd_executes_once(self):
+        """Test a burst of identical uncached queries runs the query once."""
+        calls = []
+
+        def fetch(conn, query, params=()):
+            calls.append(query)
+            time.sleep(0.05)
+            return [("row",)]
+
+        cache = QueryCache()
+        with patch.object(cache_query_module, "query_cache", cache), \
+                patch("builtins.print"):
+            cached_fetch = cache_query_module.cache_query(fetch)
+            outcomes = run_together(
+                lambda: cached_fetch(None, "SELECT * FROM users"))
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(outcome == [("row",)] for outcome in outcomes))
+
+    def test_one_backend_read_per_call(self):
+        """Test a miss and a hit each look the key up once."""
+        cache = QueryCache()
+        lookup = cache.backend.get
+        with patch.object(cache_query_module, "query_cache", cache), \
+                patch.object(cache.backend, "get",
+                             side_effect=lookup) as reads, \
+                patch("builtins.print") as printed:
+            cached_fetch = cache_query_module.cache_query(
+                lambda conn, query: [("row",)])
+            cached_fetch(None, "SELECT * FROM users")
+            self.assertEqual(reads.call_count, 1)
+            cached_fetch(None, "SELECT * FROM users")
+            self.assertEqual(reads.call_count, 2)
+        self.assertIn("[CACHE HIT]", printed.call_args[0][0])
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Unit tests for query instrumentation.
+
+This module contains tests for:
+- `fingerprint`: literal and IN-list normalisation
+- `QueryInstrumentation`: sampling, slow queries, ring buffer overflow,
+  failing listeners
+- `instrument_query`: recording sync and async calls
+"""
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import query_instrumentation
+from query_instrumentation import (QueryInstrumentation, fingerprint,
+                                   instrument_query, params_hash)
+
+
+class TestFingerprint(unittest.TestCase):
+    """Tests for query fingerprinting."""
+
+    def test_literals_are_replaced(self):
+        """Test string and number literals become placeholders."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE id = 42 AND name = 'O''Brien'"),
+            "SELECT * FROM users WHERE id = ? AND name = ?")
+
+    def test_in_lists_collapse(self):
+        """Test IN lists of any length share a fingerprint."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE id IN (1, 2, 3)"),
+            fingerprint("SELECT * FROM users\n WHERE id IN (?)"))
+
+    def test_identifiers_keep_digits(self):
+        """Test digits inside identifiers are left alone."""
+        self.assertEqual(fingerprint("SELECT col1 FROM t2"),
+                         "SELECT col1 FROM t2")
+
+    def test_params_hash(self):
+        """Test equal parameters hash equally and dict order is ignored."""
+        self.assertEqual(params_hash((1, "a")), params_hash((1, "a")))
+        self.assertNotEqual(params_hash((1,)), params_hash((2,)))
+        self.assertEqual(params_hash({"a": 1, "b": 2}),
+                         params_hash({"b": 2, "a": 1}))
+        self.assertIsNone(params_hash(None))
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Tests for the recorder and the decorator."""
+
+    def setUp(self):
+        """Route the decorator to a fresh recorder with a list sink."""
+        self.records = []
+        self.recorder = QueryInstrumentation(sink=self.records.extend)
+        patcher = patch.object(query_instrumentation, "instrumentation",
+                               self.recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Keep the background flusher out of the way
+        self.recorder._flusher = object()
+
+    def test_records_sync_call(self):
+        """Test a call is recorded with its rows and parameters."""
+        @instrument_query
+        def fetch(conn, query, params=()):
+            return [("a",), ("b",)]
+
+        fetch(None, "SELECT * FROM users WHERE id = ?", (7,))
+        self.recorder.flush()
+        [record] = self.records
+        self.assertEqual(record.fingerprint, "SELECT * FROM users WHERE id = ?")
+        self.assertEqual(record.params_hash, params_hash((7,)))
+        self.assertEqual(record.rows, 2)
+        self.assertIsNone(record.error)
+        self.assertGreaterEqual(record.duration, 0)
+
+    def test_records_errors_and_reraises(self):
+        """Test a failing call is recorded with its error."""
+        @instrument_query
+        async def fetch(query):
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(fetch(query="SELECT 1"))
+        self.recorder.flush()
+        self.assertEqual(self.records[0].error, "ValueError: boom")
+
+    def test_disabled_records_nothing(self):
+        """Test nothing is recorded while disabled."""
+        @instrument_query
+        def fetch(query):
+            return []
+
+        self.recorder.configure(enabled=False)
+        fetch("SELECT 1")
+        self.recorder.flush()
+        self.assertEqual(self.records, [])
+
+    def test_sampling_keeps_slow_queries(self):
+        """Test unsampled fast queries are skipped but slow ones kept."""
+        self.recorder.configure(sample_rate=0.0, slow_threshold=0.5)
+        self.recorder.record("SELECT 1", None, 0.01, 1, None)
+        self.recorder.record("SELECT 2", None, 0.9, 1, None)
+        self.recorder.flush()
+        self.assertEqual([r.fingerprint for r in self.records], ["SELECT ?"])
+        self.assertTrue(self.records[0].slow)
+
+    def test_full_buffer_drops_oldest(self):
+        """Test overflow keeps the newest records and counts the drops."""
+        self.recorder.configure(capacity=3)
+        for i in range(5):
+            self.recorder.record(f"SELECT * FROM t{i}", None, 0.0, 0, None)
+        self.recorder.flush()
+        self.assertEqual([r.fingerprint[-2:] for r in self.records],
+                         ["t2", "t3", "t4"])
+        self.assertEqual(self.recorder.dropped, 2)
+
+    def test_failing_listener_is_logged_not_raised(self):
+        """Test a listener error leaves the call's result and the log intact."""
+        def broken(query, duration, rows, error):
+            raise RuntimeError("listener bug")
+
+        @instrument_query
+        def fetch(query):
+            return [1]
+
+        self.recorder.add_listener(broken)
+        with self.assertLogs("query_log", level="ERROR"):
+            self.assertEqual(fetch("SELECT 1"), [1])
+        self.recorder.flush()
+        self.assertEqual([r.fingerprint for r in self.records], ["SELECT ?"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Unit tests for per-fingerprint query statistics.
+
+This module contains tests for:
+- `LatencyHistogram`: percentile accuracy
+- `QueryStats`: lazy aggregation by fingerprint, top-N and exports
+- `serve`: the /metrics and /stats.json endpoint
+"""
+
+import json
+import random
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+from query_instrumentation import QueryInstrumentation, fingerprint
+from query_stats import LatencyHistogram, QueryStats, serve
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Tests for the log-linear histogram."""
+
+    def test_percentiles_within_bucket_error(self):
+        """Test percentiles land within ~3% of the exact values."""
+        rng = random.Random(7)
+        samples = sorted(rng.lognormvariate(-6, 1.5) for _ in range(20000))
+        histogram = LatencyHistogram()
+        for sample in samples:
+            histogram.record(sample)
+        for q in (0.5, 0.95, 0.99):
+            exact = samples[int(q * len(samples)) - 1]
+            self.assertAlmostEqual(histogram.percentile(q) / exact, 1,
+                                   delta=0.04)
+        self.assertEqual(histogram.percentile(1.0), samples[-1])
+
+    def test_bucket_count_is_bounded(self):
+        """Test many samples share few buckets."""
+        histogram = LatencyHistogram()
+        for i in range(100000):
+            histogram.record(i / 1e5)
+        self.assertLess(len(histogram.counts), 600)
+
+    def test_empty(self):
+        """Test an empty histogram has no percentiles."""
+        self.assertIsNone(LatencyHistogram().percentile(0.5))
+
+
+class TestQueryStats(unittest.TestCase):
+    """Tests for the collector."""
+
+    def setUp(self):
+        """Attach a fresh collector to a fresh recorder."""
+        self.recorder = QueryInstrumentation(sink=lambda records: None)
+        self.recorder._flusher = object()
+        self.stats = QueryStats()
+        self.stats.attach(self.recorder)
+
+    def test_groups_by_fingerprint(self):
+        """Test calls differing only in literals share one entry."""
+        self.recorder.record("SELECT * FROM users WHERE id = 1", None, 0.01, 1, None)
+        self.recorder.record("SELECT * FROM users WHERE id = 2", None, 0.03, 1, None)
+        self.recorder.record("SELECT * FROM users WHERE id = 3", None, 0.02, 0,
+                             ValueError("x"))
+        snapshot = self.stats.snapshot()
+        self.assertEqual(list(snapshot), ["SELECT * FROM users WHERE id = ?"])
+        summary = snapshot["SELECT * FROM users WHERE id = ?"]
+        self.assertEqual(summary["calls"], 3)
+        self.assertEqual(summary["rows"], 2)
+        self.assertEqual(summary["errors"], 1)
+        self.assertAlmostEqual(summary["total_seconds"], 0.06)
+
+    def test_sees_unsampled_calls(self):
+        """Test statistics count calls that sampling left out of the log."""
+        self.recorder.configure(sample_rate=0.0)
+        for _ in range(10):
+            self.recorder.record("SELECT 1", None, 0.001, 1, None)
+        self.assertEqual(self.stats.snapshot()["SELECT ?"]["calls"], 10)
+
+    def test_aggregates_lazily(self):
+        """Test calls are only buffered until read or the pending limit."""
+        with patch("query_stats.fingerprint", wraps=fingerprint) as spy:
+            for _ in range(10):
+                self.recorder.record("SELECT 1", None, 0.001, 1, None)
+            spy.assert_not_called()
+            self.assertEqual(self.stats.snapshot()["SELECT ?"]["calls"], 10)
+            self.assertEqual(spy.call_count, 10)
+        with patch("query_stats.PENDING_LIMIT", 4):
+            for _ in range(4):
+                self.recorder.record("SELECT 1", None, 0.001, 1, None)
+        self.assertEqual(len(self.stats._pending), 0)
+
+    def test_reset_drops_pending_calls(self):
+        """Test reset discards calls not yet aggregated."""
+        self.recorder.record("SELECT 1", None, 0.001, 1, None)
+        self.stats.reset()
+        self.assertEqual(self.stats.snapshot(), {})
+
+    def test_top_and_report(self):
+        """Test top-N orders by the chosen field."""
+        self.recorder.record("SELECT * FROM a", None, 0.5, 1, None)
+        for _ in range(100):
+            self.recorder.record("SELECT * FROM b", None, 0.01, 1, None)
+        self.assertEqual([key for key, _ in self.stats.top(2)],
+                         ["SELECT * FROM b", "SELECT * FROM a"])
+        self.assertEqual(self.stats.top(1, by="p99_seconds")[0][0],
+                         "SELECT * FROM a")
+        report = self.stats.report(1)
+        self.assertIn("SELECT * FROM b", report)
+        self.assertNotIn("SELECT * FROM a", report)
+
+    def test_prometheus_text(self):
+        """Test the Prometheus export escapes labels and has all series."""
+        self.recorder.record('SELECT "name" FROM users', None, 0.01, 4, None)
+        text = self.stats.to_prometheus()
+        label = 'fingerprint="SELECT \\"name\\" FROM users"'
+        self.assertIn(f'query_duration_seconds{{{label},quantile="0.99"}}', text)
+        self.assertIn(f"query_duration_seconds_count{{{label}}} 1", text)
+        self.assertIn(f"query_rows_total{{{label}}} 4", text)
+
+    def test_endpoint(self):
+        """Test /metrics and /stats.json are served."""
+        self.recorder.record("SELECT 1", None, 0.01, 1, None)
+        server = serve(port=0, stats=self.stats)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            self.assertIn(b"query_duration_seconds_count", response.read())
+        with urllib.request.urlopen(f"{base}/stats.json") as response:
+            self.assertIn("SELECT ?", json.load(response)["queries"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Unit tests for the retry policy engine.
+
+This module contains tests for:
+- `is_retryable`: transient vs permanent database errors
+- `RetryPolicy`: backoff, deadline, counters and the async path
+- `CircuitBreaker`: opening, failing fast and recovering
+"""
+
+import asyncio
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+from retry_policy import (CircuitBreaker, CircuitOpenError, RetryPolicy,
+                          RetryStats, is_retryable)
+
+LOCKED = sqlite3.OperationalError("database is locked")
+
+
+class MySQLError(Exception):
+    """Stand-in for mysql.connector errors, which carry an errno."""
+
+    def __init__(self, errno):
+        super().__init__(f"MySQL error {errno}")
+        self.errno = errno
+
+
+def failing(times, error=LOCKED, result="ok"):
+    """Return a function that raises error `times` times, then succeeds."""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= times:
+            raise error
+        return result
+    func.calls = calls
+    return func
+
+
+class TestIsRetryable(unittest.TestCase):
+    """Tests for error classification."""
+
+    def test_transient_errors(self):
+        """Test locked/busy and lost-connection errors are retried."""
+        self.assertTrue(is_retryable(LOCKED))
+        self.assertTrue(is_retryable(MySQLError(2013)))
+        self.assertTrue(is_retryable(MySQLError(1213)))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+
+    def test_permanent_errors(self):
+        """Test syntax and constraint errors are not retried."""
+        self.assertFalse(is_retryable(
+            sqlite3.OperationalError('near "SELEC": syntax error')))
+        self.assertFalse(is_retryable(sqlite3.IntegrityError("UNIQUE")))
+        self.assertFalse(is_retryable(MySQLError(1064)))
+        self.assertFalse(is_retryable(CircuitOpenError("open")))
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """Tests for RetryPolicy.call and call_async."""
+
+    def setUp(self):
+        """Give every test its own counters and no real sleeping."""
+        self.stats = RetryStats()
+        patcher = patch("retry_policy.time.sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        print_patcher = patch("builtins.print")
+        print_patcher.start()
+        self.addCleanup(print_patcher.stop)
+
+    def policy(self, **options):
+        options.setdefault("breaker", False)
+        return RetryPolicy(stats=self.stats, **options)
+
+    def test_retries_transient_errors(self):
+        """Test a transient error is retried until the call succeeds."""
+        func = failing(2)
+        self.assertEqual(self.policy(retries=3).call(func), "ok")
+        self.assertEqual(len(func.calls), 3)
+        counts = self.stats.snapshot()
+        self.assertEqual(counts["retries"], 2)
+        self.assertEqual(counts["successes"], 1)
+
+    def test_permanent_error_is_not_retried(self):
+        """Test a non-transient error is raised after one attempt."""
+        func = failing(1, error=sqlite3.IntegrityError("UNIQUE"))
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.policy(retries=5).call(func)
+        self.assertEqual(len(func.calls), 1)
+        self.assertEqual(self.stats.snapshot()["not_retryable"], 1)
+
+    def test_gives_up_after_retries(self):
+        """Test the last error is raised once attempts run out."""
+        func = failing(10)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.policy(retries=3).call(func)
+        self.assertEqual(len(func.calls), 3)
+        self.assertEqual(self.stats.snapshot()["exhausted"], 1)
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Test delays stay within [0, min(max_delay, base * 2**n)]."""
+        policy = self.policy(base_delay=0.1, max_delay=1.0)
+        for attempt in range(1, 10):
+            delay = policy.backoff(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(1.0, 0.1 * 2 ** (attempt - 1)))
+
+    def test_deadline_stops_retrying(self):
+        """Test no retry starts past the total deadline."""
+        func = failing(10)
+        policy = self.policy(retries=10, base_delay=10, max_delay=10,
+                             deadline=0.001)
+        with patch("retry_policy.random.uniform", return_value=5):
+            with self.assertRaises(sqlite3.OperationalError):
+                policy.call(func)
+        self.assertEqual(len(func.calls), 1)
+        self.assertEqual(self.stats.snapshot()["deadline_exceeded"], 1)
+
+    def test_async_retries(self):
+        """Test the async path retries with asyncio.sleep."""
+        calls = []
+
+        async def func():
+            calls.append(1)
+            if len(calls) < 3:
+                raise LOCKED
+            return "ok"
+
+        async def no_sleep(delay):
+            pass
+
+        with patch("retry_policy.asyncio.sleep", no_sleep):
+            result = asyncio.run(self.policy(retries=3).call_async(func))
+        self.assertEqual(result, "ok")
+        self.assertEqual(len(calls), 3)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Tests for the shared circuit breaker."""
+
+    def setUp(self):
+        """Silence retry messages and skip real sleeping."""
+        for target in ("retry_policy.time.sleep", "builtins.print"):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_opens_and_fails_fast(self):
+        """Test an open breaker rejects calls without running them."""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        policy = RetryPolicy(retries=3, breaker=breaker, stats=RetryStats())
+        with self.assertRaises(sqlite3.OperationalError):
+            policy.call(failing(10))
+        self.assertEqual(breaker.state, "open")
+
+        func = failing(0)
+        with self.assertRaises(CircuitOpenError):
+            policy.call(func)
+        self.assertEqual(func.calls, [])
+
+    def test_half_open_trial_closes_breaker(self):
+        """Test a successful trial call after reset_timeout closes it."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        policy = RetryPolicy(retries=1, breaker=breaker, stats=RetryStats())
+        with self.assertRaises(sqlite3.OperationalError):
+            policy.call(failing(1))
+        self.assertEqual(breaker.state, "open")
+
+        self.assertEqual(policy.call(failing(0)), "ok")
+        self.assertEqual(breaker.state, "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
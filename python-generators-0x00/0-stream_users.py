@@ -1,26 +1,53 @@
 #!/usr/bin/python3
 import mysql.connector
 
+import db_pool
 
-def stream_users():
-    """Fetches data from table user_data row by row."""
+
+def stream_users(server_side=False, fetch_size=1000):
+    """Fetches data from table user_data row by row.
+
+    Both modes stream: mysql.connector cursors are unbuffered unless asked
+    otherwise, so rows are read off the socket as they are consumed rather
+    than loaded up front. server_side=True only changes how they are read,
+    in fetchmany chunks of fetch_size instead of one row per iteration
+    step. Either way, a stream abandoned before the end shuts the
+    connection down instead of draining the rest of the table.
+    db_pool.PoolTimeout is raised rather than ending the stream, so an
+    exhausted pool is not mistaken for an empty table.
+    """
+    connection = None
+    cursor = None
+    exhausted = False
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',
-            database='ALX_prodev'
-        )
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data")
-        for row in cursor:
-            yield row
+        connection = db_pool.acquire()
+        if server_side:
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            cursor.execute("SELECT * FROM user_data")
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        else:
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            cursor.execute("SELECT * FROM user_data")
+            for row in cursor:
+                yield row
+        exhausted = True
+    except db_pool.PoolTimeout:
+        raise
     except mysql.connector.Error as error:
         print(f"Error: {error}")
-    
-    finally:
-        cursor.close()
-        connection.close()
 
-
-    
\ No newline at end of file
+    finally:
+        if not exhausted and connection is not None:
+            # The server is still sending rows nobody will read; drop the
+            # socket instead of draining the rest of the table.
+            connection.shutdown()
+        else:
+            if cursor is not None:
+                cursor.close()
+            if connection is not None:
+                connection.close()
@@ -1,46 +1,190 @@
 #!/usr/bin/python3
 
+import operator
+import re
+from array import array
+from itertools import compress
+
 import mysql.connector
 
+import db_pool
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_OPERATORS = ('=', '!=', '<', '<=', '>', '>=', 'LIKE', 'IN')
+_COMPARISONS = {
+    '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge,
+}
+_NUMERIC_COLUMNS = ('age',)
+
+
+def _column(name):
+    """Returns name if it is a plain column identifier"""
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid column: {name!r}")
+    return name
+
+
+def build_query(columns=None, where=None):
+    """Returns the SELECT on user_data and its bound parameters.
+
+    columns is the projection (all columns if None); where is a list of
+    (column, operator, value) predicates that are ANDed together, e.g.
+    [('age', '>', 25)]. Values are always bound, never formatted in.
+    """
+    projection = ", ".join(_column(c) for c in columns) if columns else "*"
+    query = f"SELECT {projection} FROM user_data"
+    params = []
+    clauses = []
+    for column, operator, value in where or ():
+        operator = operator.upper()
+        if operator not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator!r}")
+        if operator == 'IN':
+            value = list(value)
+            if not value:
+                clauses.append("FALSE")
+                continue
+            placeholders = ", ".join(["%s"] * len(value))
+            clauses.append(f"{_column(column)} IN ({placeholders})")
+            params.extend(value)
+        else:
+            clauses.append(f"{_column(column)} {operator} %s")
+            params.append(value)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    return query, tuple(params)
+
+
+def to_columns(names, rows):
+    """Transposes row tuples into a dict of per-column arrays.
+
+    Numeric columns become float64 arrays (NumPy if installed, otherwise
+    array('d')); the rest become NumPy object arrays holding the fetched
+    str objects (a dtype=str array would copy each into fixed-width
+    UTF-32, padded to the longest value) or plain tuples.
+    """
+    columns = zip(*rows) if rows else [()] * len(names)
+    batch = {}
+    for name, values in zip(names, columns):
+        if name in _NUMERIC_COLUMNS:
+            if np is not None:
+                batch[name] = np.fromiter(values, dtype=np.float64,
+                                          count=len(rows))
+            else:
+                batch[name] = array('d', map(float, values))
+        elif np is not None:
+            batch[name] = np.array(values, dtype=object)
+        else:
+            batch[name] = values
+    return batch
+
 
-def stream_users_in_batches(batch_size):
-    """Fetches rows in batches"""
+def column_mask(batch, column, op, value):
+    """Evaluates `column op value` over a columnar batch in one pass"""
+    compare = _COMPARISONS[op]
+    values = batch[column]
+    if np is not None:
+        return compare(values, value)
+    return [compare(v, value) for v in values]
+
+
+def filter_columns(batch, mask):
+    """Keeps the rows of a columnar batch where mask is true"""
+    if np is not None:
+        return {name: values[mask] for name, values in batch.items()}
+    filtered = {}
+    for name, values in batch.items():
+        kept = compress(values, mask)
+        if isinstance(values, array):
+            filtered[name] = array(values.typecode, kept)
+        else:
+            filtered[name] = tuple(kept)
+    return filtered
+
+
+def stream_users_in_batches(batch_size, columns=None, where=None,
+                            columnar=False, raise_errors=False):
+    """Fetches rows in batches
+
+    columns and where are pushed down into the SQL (see build_query), so
+    only the matching rows and requested columns cross the wire.
+    columnar=True yields each batch as per-column arrays (see to_columns)
+    instead of a list of dicts. Database errors are printed and end the
+    stream early unless raise_errors=True, which re-raises them so a
+    caller that needs every row can tell a failure from the end.
+    db_pool.PoolTimeout is always raised, so an exhausted pool never looks
+    like an empty table.
+    """
+    query, params = build_query(columns, where)
+    connection = None
+    cursor = None
+    exhausted = False
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',
-            database='ALX_prodev'
-        )
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data")
-        batch = []
-        for row in cursor:
-            batch.append(row)
-            if len(batch) == batch_size:
-                yield batch
-                batch = []
-        if batch:
+        connection = db_pool.acquire()
+        cursor = connection.cursor(dictionary=not columnar, buffered=False)
+        cursor.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            if columnar:
+                batch = to_columns(cursor.column_names, batch)
             yield batch
-            
-    except connection.Error as error:
+        exhausted = True
+
+    except db_pool.PoolTimeout:
+        raise
+
+    except mysql.connector.Error as error:
+        if raise_errors:
+            raise
         print(f"Error: {error}")
-    
+
     finally:
-        cursor.close()
-        connection.close()
-        
-        
-
-def batch_processing(batch_size):
-    """ Process each batch based on users with age 25 or over"""
-    users = []
-    for batch in stream_users_in_batches(batch_size):
-        for user in batch:
-            if user['age'] > 25:
-                
-                users.append(user)
-        
-    return users
-                
-    
\ No newline at end of file
+        if not exhausted and connection is not None:
+            # Unread rows are still pending on an abandoned stream; drop the
+            # socket instead of draining them.
+            connection.shutdown()
+        else:
+            if cursor is not None:
+                cursor.close()
+            if connection is not None:
+                connection.close()
+
+
+def batch_processing(batch_size, columns=None, columnar=False,
+                     pushdown=True):
+    """ Yields batches of users over the age of 25
+
+    By default the age filter runs in MySQL, so each batch only holds
+    matching rows. pushdown=False filters after fetching instead, which
+    for columnar batches is a single vectorized pass over the age column.
+    age is then fetched even if columns leaves it out, and dropped again
+    after filtering.
+    """
+    where = [('age', '>', 25)] if pushdown else None
+    drop_age = not pushdown and columns is not None and 'age' not in columns
+    if drop_age:
+        columns = list(columns) + ['age']
+    for batch in stream_users_in_batches(batch_size, columns, where,
+                                         columnar):
+        if pushdown:
+            yield batch
+            continue
+        if columnar:
+            batch = filter_columns(batch, column_mask(batch, 'age', '>', 25))
+            if drop_age:
+                del batch['age']
+        else:
+            batch = [user for user in batch if user['age'] > 25]
+            if drop_age:
+                for user in batch:
+                    del user['age']
+        yield batch
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+"""Resumable scans of user_data that checkpoint the last user_id read.
+
+checkpointed_batches keeps its checkpoint in a local state file and gives
+at-least-once delivery: a batch is only checkpointed once the consumer
+asks for the next one, so a crash mid-batch replays that batch.
+
+process_exactly_once keeps the checkpoint in a scan_checkpoint table and
+commits it in the same transaction as the handler's own writes, so each
+batch's effects land exactly once.
+"""
+import json
+import os
+
+from seed import connect_to_prodev
+
+build_query = __import__('1-batch_processing').build_query
+
+
+def load_checkpoint(state_file):
+    """Returns the last user_id recorded in state_file, or None"""
+    try:
+        with open(state_file) as f:
+            return json.load(f)['last_key']
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(state_file, last_key):
+    """Atomically records last_key in state_file"""
+    tmp = f"{state_file}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'last_key': last_key}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, state_file)
+
+
+def _next_batch(cursor, batch_size, last_key, columns, where):
+    """Reads the batch of rows after last_key in user_id order"""
+    if columns and 'user_id' not in columns:
+        columns = ['user_id'] + list(columns)
+    predicates = list(where or ())
+    if last_key is not None:
+        predicates.append(('user_id', '>', last_key))
+    query, params = build_query(columns, predicates)
+    cursor.execute(query + " ORDER BY user_id LIMIT %s",
+                   params + (batch_size,))
+    return cursor.fetchall()
+
+
+def checkpointed_batches(batch_size, state_file, columns=None, where=None,
+                         reset_on_finish=True):
+    """Yields batches of user_data, resuming after the checkpoint in
+    state_file. The state file is removed once the scan completes unless
+    reset_on_finish is False.
+    """
+    last_key = load_checkpoint(state_file)
+    connection = connect_to_prodev()
+    try:
+        cursor = connection.cursor(dictionary=True)
+        while True:
+            batch = _next_batch(cursor, batch_size, last_key, columns, where)
+            if not batch:
+                break
+            yield batch
+            last_key = batch[-1]['user_id']
+            save_checkpoint(state_file, last_key)
+        cursor.close()
+    finally:
+        connection.close()
+    if reset_on_finish and os.path.exists(state_file):
+        os.remove(state_file)
+
+
+def process_exactly_once(job, batch_size, handler, columns=None, where=None):
+    """Runs handler(batch, connection) over user_data for job, resuming
+    after the last committed batch.
+
+    handler must do its writes on the given connection without
+    committing; they are committed together with the checkpoint, or
+    rolled back with it if anything fails.
+    """
+    connection = connect_to_prodev()
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS scan_checkpoint ("
+            "job VARCHAR(64) PRIMARY KEY, last_key VARCHAR(36) NOT NULL)")
+        cursor.execute("SELECT last_key FROM scan_checkpoint WHERE job = %s",
+                       (job,))
+        row = cursor.fetchone()
+        last_key = row['last_key'] if row else None
+        processed = 0
+        while True:
+            batch = _next_batch(cursor, batch_size, last_key, columns, where)
+            if not batch:
+                break
+            try:
+                handler(batch, connection)
+                last_key = batch[-1]['user_id']
+                cursor.execute(
+                    "INSERT INTO scan_checkpoint (job, last_key) "
+                    "VALUES (%s, %s) "
+                    "ON DUPLICATE KEY UPDATE last_key = VALUES(last_key)",
+                    (job, last_key))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            processed += len(batch)
+        cursor.close()
+        return processed
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    state_file = sys.argv[1] if len(sys.argv) > 1 else "user_scan.state"
+    rows = 0
+    for batch in checkpointed_batches(1000, state_file):
+        rows += len(batch)
+    print(f"Scanned {rows} users")
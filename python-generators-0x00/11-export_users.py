@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+"""Streaming export of user_data to CSV, JSON Lines or Parquet.
+
+Batches are read from stream_users_in_batches on the calling thread and
+handed to a background writer thread through a bounded queue, so database
+reads overlap with encoding, compression and disk writes. The export is
+written to <path>.partial and renamed into place only once every row is
+written; any database or writer error removes it and is raised.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+import time
+from decimal import Decimal
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+COMPRESSIONS = (None, 'gzip', 'zstd')
+
+_DONE = object()
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+def _open_text(path, compression):
+    """Opens path for text writing through the requested compressor"""
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    if compression == 'zstd':
+        raw = open(path, 'wb')
+        stream = zstandard.ZstdCompressor().stream_writer(raw)
+        return io.TextIOWrapper(stream, newline='', encoding='utf-8')
+    return open(path, 'w', newline='', encoding='utf-8')
+
+
+class _TextWriter:
+    """Writes dict batches as CSV or JSON Lines"""
+
+    def __init__(self, path, fmt, compression):
+        self.fmt = fmt
+        self.file = _open_text(path, compression)
+        self.csv = None
+
+    def write(self, batch):
+        if self.fmt == 'jsonl':
+            self.file.writelines(
+                json.dumps(row, default=_json_default) + "\n" for row in batch)
+            return
+        if self.csv is None:
+            self.csv = csv.DictWriter(self.file, fieldnames=list(batch[0]))
+            self.csv.writeheader()
+        self.csv.writerows(batch)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    """Writes dict batches as row groups of a Parquet file"""
+
+    def __init__(self, path, compression):
+        self.path = path
+        self.compression = compression or 'none'
+        self.writer = None
+
+    def write(self, batch):
+        table = pyarrow.Table.from_pylist(
+            [{k: _json_default(v) if isinstance(v, Decimal) else v
+              for k, v in row.items()} for row in batch])
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(
+                self.path, table.schema, compression=self.compression)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _writer_for(path, fmt, compression):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt!r}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression!r}")
+    if compression == 'zstd' and zstandard is None and fmt != 'parquet':
+        raise ImportError("zstd compression requires the zstandard package")
+    if fmt == 'parquet':
+        if pyarrow is None:
+            raise ImportError("Parquet export requires the pyarrow package")
+        return _ParquetWriter(path, compression)
+    return _TextWriter(path, fmt, compression)
+
+
+def _drain(batches, writer, errors):
+    """Writer thread: writes batches until _DONE, recording any error.
+    After an error it keeps draining so the reader never blocks on put.
+    """
+    while True:
+        batch = batches.get()
+        if batch is _DONE:
+            break
+        if errors:
+            continue
+        try:
+            writer.write(batch)
+        except Exception as error:
+            errors.append(error)
+    try:
+        writer.close()
+    except Exception as error:
+        errors.append(error)
+
+
+def export_users(path, fmt='csv', compression=None, batch_size=10000,
+                 columns=None, where=None, queue_depth=4):
+    """Exports user_data to path and returns the run's throughput stats.
+
+    columns and where are pushed down as in stream_users_in_batches. At
+    most queue_depth batches wait for the writer, which holds the reader
+    back if the disk or compressor is the bottleneck.
+    """
+    partial = path + '.partial'
+    writer = _writer_for(partial, fmt, compression)
+    batches = queue.Queue(queue_depth)
+    errors = []
+    thread = threading.Thread(target=_drain, args=(batches, writer, errors),
+                              daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    rows = 0
+    try:
+        try:
+            for batch in stream_users_in_batches(batch_size, columns, where,
+                                                 raise_errors=True):
+                if errors:
+                    break
+                batches.put(batch)
+                rows += len(batch)
+        finally:
+            batches.put(_DONE)
+            thread.join()
+        if errors:
+            raise errors[0]
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    if os.path.exists(partial):  # Parquet writes no file for zero rows
+        os.replace(partial, path)
+
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    stats = {
+        'rows': rows,
+        'bytes': size,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else 0.0,
+        'mb_per_sec': size / (1024 * 1024) / elapsed if elapsed else 0.0,
+    }
+    print(f"Exported {rows} rows ({size / (1024 * 1024):.1f} MB) to {path} "
+          f"in {elapsed:.2f}s: {stats['rows_per_sec']:.0f} rows/s, "
+          f"{stats['mb_per_sec']:.1f} MB/s")
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "user_data_export.csv"
+    fmt = sys.argv[2] if len(sys.argv) > 2 else 'csv'
+    compression = sys.argv[3] if len(sys.argv) > 3 else None
+    export_users(path, fmt, compression)
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+"""Benchmark harness for the python-generators-0x00 access patterns.
+
+For every table size the table is (re)seeded through seed.py, then each
+access pattern runs in its own child process so peak RSS is not polluted
+by the harness or by earlier runs. Per pattern it records rows/sec,
+time-to-first-row, peak RSS, and the statements and connections the
+server saw (global Questions/Connections deltas, so run it against an
+otherwise idle server).
+
+Usage: ./12-benchmark_suite.py [--sizes 10000 1000000 10000000]
+                               [--limit ROWS] [--output results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import time
+from datetime import datetime, timezone
+
+import seed
+
+stream_users = __import__('0-stream_users').stream_users
+batches = __import__('1-batch_processing')
+lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+stream_user_ages = __import__('4-stream_ages').stream_user_ages
+memory_benchmark = __import__('5-memory_benchmark')
+peak_rss_mb = memory_benchmark.peak_rss_mb
+
+
+def _rows(generator, per_item):
+    """Adapts a generator of rows or of batches to a generator of counts"""
+    for item in generator:
+        yield len(item) if per_item == 'batch' else 1
+
+
+PATTERNS = {
+    # Baseline that loads the whole result set before the first row
+    'buffered_cursor': lambda: _rows(memory_benchmark.buffered_users(), 'row'),
+    'stream_users': lambda: _rows(stream_users(), 'row'),
+    'stream_users_server_side': lambda: _rows(
+        stream_users(server_side=True), 'row'),
+    'stream_users_in_batches': lambda: _rows(
+        batches.stream_users_in_batches(1000), 'batch'),
+    'lazy_paginate_offset': lambda: _rows(lazy_paginate(100), 'batch'),
+    'lazy_paginate_keyset': lambda: _rows(
+        lazy_paginate(100, keyset=True, persistent=True), 'batch'),
+    'stream_user_ages': lambda: _rows(stream_user_ages(), 'row'),
+}
+
+
+def seed_to(rows):
+    """Makes user_data hold exactly rows rows"""
+    connection = seed.connect_db()
+    seed.create_database(connection)
+    connection.close()
+    connection = seed.connect_to_prodev()
+    seed.create_table(connection)
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    existing = cursor.fetchone()[0]
+    if existing > rows:
+        cursor.execute("TRUNCATE TABLE user_data")
+        existing = 0
+    cursor.close()
+    if existing < rows:
+        seed.insert_synthetic(connection, rows - existing)
+    connection.close()
+
+
+def server_counters():
+    """Returns the server's global statement and connection counters.
+
+    They are read on a fresh, unpooled connection, so reading them costs
+    the same every time (see harness_overhead).
+    """
+    connection = seed.connect_db()
+    if connection is None:
+        raise RuntimeError("Could not connect to read the server counters")
+    cursor = connection.cursor()
+    cursor.execute(
+        "SHOW GLOBAL STATUS WHERE Variable_name IN ('Questions', 'Connections')")
+    counters = {name: int(value) for name, value in cursor.fetchall()}
+    cursor.close()
+    connection.close()
+    return counters
+
+
+def _measure(name, limit, results):
+    """Child process: runs one pattern and reports its metrics"""
+    start = time.perf_counter()
+    first_row = None
+    rows = 0
+    generator = PATTERNS[name]()
+    for count in generator:
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        rows += count
+        if limit and rows >= limit:
+            break
+    generator.close()
+    elapsed = time.perf_counter() - start
+    results.put({
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else 0.0,
+        'time_to_first_row': first_row,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+
+
+def harness_overhead():
+    """Returns the Questions/Connections that one server_counters() call
+    adds, measured with two back-to-back calls
+    """
+    first = server_counters()
+    second = server_counters()
+    return {name: second[name] - first[name] for name in first}
+
+
+def run_pattern(name, limit=None, overhead=None):
+    """Runs one pattern in a child process and returns its metrics.
+
+    overhead (from harness_overhead, measured here if None) is subtracted
+    from the server's counter deltas.
+    """
+    overhead = overhead or harness_overhead()
+    before = server_counters()
+    results = multiprocessing.Queue()
+    worker = multiprocessing.Process(target=_measure,
+                                     args=(name, limit, results))
+    worker.start()
+    metrics = results.get()
+    worker.join()
+    after = server_counters()
+    metrics['round_trips'] = (after['Questions'] - before['Questions']
+                              - overhead['Questions'])
+    metrics['connections'] = (after['Connections'] - before['Connections']
+                              - overhead['Connections'])
+    return metrics
+
+
+def run_suite(sizes, patterns=None, limit=None):
+    """Benchmarks every pattern at every table size"""
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'limit': limit,
+        'harness_overhead': harness_overhead(),
+        'results': [],
+    }
+    for size in sizes:
+        seed_to(size)
+        for name in patterns or PATTERNS:
+            metrics = run_pattern(name, limit, report['harness_overhead'])
+            report['results'].append(dict(size=size, pattern=name, **metrics))
+            print(f"{size:>10} {name:<26} {metrics['rows_per_sec']:>12.0f} rows/s"
+                  f"  ttfr {metrics['time_to_first_row'] or 0:.4f}s"
+                  f"  rss {metrics['peak_rss_mb']:.1f} MB"
+                  f"  round trips {metrics['round_trips']}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 1000000, 10000000])
+    parser.add_argument('--patterns', nargs='+', choices=list(PATTERNS))
+    parser.add_argument('--limit', type=int,
+                        help="stop each pattern after this many rows")
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.patterns, args.limit)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
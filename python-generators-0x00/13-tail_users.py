@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+"""Change-data tailing of user_data.
+
+Polls the indexed updated_at column (see seed.ensure_change_tracking) and
+yields only rows inserted or updated since a high-water mark, in
+micro-batches, so consumers can work incrementally instead of rescanning
+the table.
+"""
+import time
+
+from seed import connect_to_prodev
+
+
+def high_water_mark(batch):
+    """Returns the (updated_at, user_id) mark after the last row of batch"""
+    return batch[-1]['updated_at'], batch[-1]['user_id']
+
+
+def _current_mark(cursor):
+    cursor.execute(
+        "SELECT updated_at, user_id FROM user_data "
+        "ORDER BY updated_at DESC, user_id DESC LIMIT 1")
+    row = cursor.fetchone()
+    return (row['updated_at'], row['user_id']) if row else None
+
+
+def tail_users(since=None, batch_size=500, poll_interval=1.0, settle=1.0,
+               from_start=False, stop=None):
+    """Yields micro-batches of user_data rows changed after since.
+
+    since is an (updated_at, user_id) mark as returned by high_water_mark;
+    without one the tail starts at the newest row, or at the oldest if
+    from_start is set. When caught up it sleeps poll_interval seconds
+    between polls. Rows younger than settle seconds are held back so that
+    a transaction committing a little late with an earlier timestamp is
+    not skipped. Setting the threading.Event stop ends the generator.
+    """
+    connection = connect_to_prodev()
+    try:
+        cursor = connection.cursor(dictionary=True)
+        mark = since
+        if mark is None and not from_start:
+            mark = _current_mark(cursor)
+        settle_us = int(settle * 1000000)
+        while stop is None or not stop.is_set():
+            if mark is None:
+                cursor.execute(
+                    "SELECT * FROM user_data "
+                    "WHERE updated_at <= NOW(6) - INTERVAL %s MICROSECOND "
+                    "ORDER BY updated_at, user_id LIMIT %s",
+                    (settle_us, batch_size))
+            else:
+                cursor.execute(
+                    "SELECT * FROM user_data "
+                    "WHERE (updated_at, user_id) > (%s, %s) "
+                    "AND updated_at <= NOW(6) - INTERVAL %s MICROSECOND "
+                    "ORDER BY updated_at, user_id LIMIT %s",
+                    mark + (settle_us, batch_size))
+            batch = cursor.fetchall()
+            # End the read transaction so the next poll gets a fresh
+            # snapshot instead of REPEATABLE READ's original one.
+            connection.commit()
+            if batch:
+                mark = high_water_mark(batch)
+                yield batch
+                if len(batch) == batch_size:
+                    continue
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+        cursor.close()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    for batch in tail_users():
+        for user in batch:
+            print(user)
@@ -1,29 +1,175 @@
 #!/usr/bin/python3
 
+import base64
+import json
+import queue
+import re
+import threading
+
 import mysql.connector
 from seed import connect_to_prodev
 
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_DONE = object()
 
-def paginate_users(page_size, offset):
-    """ Returs data from database using offset and limit"""
-    connection = connect_to_prodev()
+
+def _fetch_page(query, params, connection=None):
+    """Runs a page query on connection, or on a short-lived one if None"""
+    owned = connection is None
+    if owned:
+        connection = connect_to_prodev()
     cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
-    connection.close()
-    return rows
-
-
-def lazy_paginate(page_size):
-    """Generator rresponsible for loading pages """
-    offset = 0
-    while True:
-        page = paginate_users(page_size, offset)
-        if not page:
-            break
-        
-        yield page
-        offset += page_size
-        
-         
-    
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        if owned:
+            connection.close()
+
+
+def paginate_users(page_size, offset, connection=None):
+    """ Returs data from database using offset and limit"""
+    return _fetch_page("SELECT * FROM user_data LIMIT %s OFFSET %s",
+                       (page_size, offset), connection)
+
+
+def seek_query(page_size, after=None, key='user_id'):
+    """Returns the keyset page query and its parameters for the rows that
+    sort after the (key, user_id) seek position.
+    """
+    if not _IDENTIFIER.match(key):
+        raise ValueError(f"Invalid key column: {key!r}")
+    order = "user_id" if key == 'user_id' else f"{key}, user_id"
+    query = "SELECT * FROM user_data"
+    params = ()
+    if after is not None:
+        if key == 'user_id':
+            query += " WHERE user_id > %s"
+            params = (after[1],)
+        else:
+            query += f" WHERE ({key}, user_id) > (%s, %s)"
+            params = tuple(after)
+    query += f" ORDER BY {order} LIMIT %s"
+    return query, params + (page_size,)
+
+
+def paginate_users_after(page_size, after=None, key='user_id',
+                         connection=None):
+    """Returns the page of rows that sort after the (key, user_id) seek
+    position, so every page costs one index range scan whatever its depth.
+    """
+    query, params = seek_query(page_size, after, key)
+    return _fetch_page(query, params, connection)
+
+
+def page_token(page, key='user_id'):
+    """Returns an opaque token that resumes pagination after page"""
+    last = page[-1]
+    position = [key, last[key], last['user_id']]
+    raw = json.dumps(position, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_token(token):
+    """Returns the (key, value, user_id) seek position stored in token"""
+    try:
+        key, value, user_id = json.loads(base64.urlsafe_b64decode(token))
+    except (ValueError, TypeError) as error:
+        raise ValueError(f"Invalid continuation token: {token!r}") from error
+    return key, value, user_id
+
+
+def lazy_paginate(page_size, keyset=False, key='user_id', token=None,
+                  persistent=False):
+    """Generator rresponsible for loading pages
+
+    keyset=True seeks on key (any indexed column, ties broken by user_id)
+    with bound parameters instead of LIMIT/OFFSET. Passing a token from
+    page_token() resumes a keyset scan right after that page.
+
+    persistent=True keeps one connection open for the whole scan instead
+    of connecting per page; it is closed as soon as the generator is
+    exhausted, closed or garbage-collected.
+    """
+    connection = connect_to_prodev() if persistent else None
+    try:
+        if not keyset and token is None:
+            offset = 0
+            while True:
+                page = paginate_users(page_size, offset, connection)
+                if not page:
+                    break
+
+                yield page
+                offset += page_size
+            return
+
+        after = None
+        if token is not None:
+            token_key, value, user_id = decode_token(token)
+            if token_key != key:
+                raise ValueError(
+                    f"Token was issued for key {token_key!r}, not {key!r}")
+            after = (value, user_id)
+        while True:
+            page = paginate_users_after(page_size, after, key, connection)
+            if not page:
+                break
+
+            yield page
+            after = (page[-1][key], page[-1]['user_id'])
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+def _put(out, item, stop):
+    """Puts item on out unless stop is set first; returns whether it did"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _read_ahead(pages, out, stop):
+    """Producer thread: moves pages into out until exhausted or stopped"""
+    try:
+        for page in pages:
+            if not _put(out, page, stop):
+                return
+        _put(out, _DONE, stop)
+    except Exception as error:
+        _put(out, error, stop)
+    finally:
+        pages.close()
+
+
+def lazy_paginate_prefetch(page_size, depth=2, keyset=False, key='user_id',
+                           token=None):
+    """Generator that reads up to depth pages ahead on a background thread
+
+    Pages come from lazy_paginate(persistent=True) with the same keyset,
+    key and token options. The bounded queue stalls the reader once depth
+    pages are waiting, so a slow consumer never buffers the whole table.
+    """
+    pages = lazy_paginate(page_size, keyset, key, token, persistent=True)
+    out = queue.Queue(depth)
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_ahead, args=(pages, out, stop),
+                              daemon=True)
+    reader.start()
+    try:
+        while True:
+            page = out.get()
+            if page is _DONE:
+                break
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        stop.set()
+        reader.join()
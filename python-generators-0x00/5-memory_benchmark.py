@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+"""Memory-ceiling benchmark for stream_users.
+
+Seeds user_data up to the requested number of rows, then reads the whole
+table in a fresh child process for each mode and records its peak RSS.
+The baseline is a buffered cursor, which loads the full result set into
+memory before the first row is returned; stream_users' two modes both
+read unbuffered and differ only in row-by-row iteration vs fetchmany.
+
+Usage: ./5-memory_benchmark.py [rows] [fetch_size]
+"""
+import multiprocessing
+import resource
+import sys
+import time
+
+import seed
+
+stream_users = __import__('0-stream_users').stream_users
+
+
+def current_rss_mb():
+    """Returns the resident set size of this process in MB"""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / (1024 * 1024)
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def ensure_rows(rows):
+    """Tops user_data up to at least rows rows"""
+    connection = seed.connect_to_prodev()
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    existing = cursor.fetchone()[0]
+    cursor.close()
+    if existing < rows:
+        seed.insert_synthetic(connection, rows - existing)
+    connection.close()
+
+
+MODES = ('buffered', 'default', 'server-side')
+
+
+def buffered_users():
+    """Baseline: yields user_data rows from a buffered cursor, which has
+    already pulled the whole result set into memory
+    """
+    connection = seed.connect_to_prodev()
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("SELECT * FROM user_data")
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _rows(mode, fetch_size):
+    if mode == 'buffered':
+        return buffered_users()
+    return stream_users(mode == 'server-side', fetch_size)
+
+
+def _stream(mode, fetch_size, results):
+    """Reads the table and reports row count, time and memory to results"""
+    samples = []
+    start = time.perf_counter()
+    count = 0
+    for count, _ in enumerate(_rows(mode, fetch_size), 1):
+        if count % 500000 == 0:
+            samples.append((count, round(current_rss_mb(), 1)))
+    results.put({
+        'mode': mode,
+        'rows': count,
+        'seconds': round(time.perf_counter() - start, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_samples': samples,
+    })
+
+
+def run(mode, fetch_size):
+    """Runs one pass in a child process and returns its stats"""
+    results = multiprocessing.Queue()
+    worker = multiprocessing.Process(
+        target=_stream, args=(mode, fetch_size, results))
+    worker.start()
+    stats = results.get()
+    worker.join()
+    return stats
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+    fetch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    ensure_rows(rows)
+    for mode in MODES:
+        stats = run(mode, fetch_size)
+        print(f"{mode:>11}: {stats['rows']} rows in {stats['seconds']}s, "
+              f"peak RSS {stats['peak_rss_mb']} MB")
+        for count, rss in stats['rss_samples']:
+            print(f"{'':>13}{count:>9} rows -> {rss} MB")
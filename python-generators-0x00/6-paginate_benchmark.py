@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""Pages/sec of lazy_paginate with a connection per page vs one persistent
+connection for the whole scan.
+
+The per-page runs use a pool that keeps no idle connections, so every
+page pays a fresh connect and handshake as it would without db_pool.
+
+Usage: ./6-paginate_benchmark.py [pages] [page_size]
+"""
+import sys
+import time
+
+import db_pool
+
+lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+ensure_rows = __import__('5-memory_benchmark').ensure_rows
+
+
+def pages_per_second(pages, page_size, keyset, persistent):
+    """Reads up to pages pages and returns the observed pages/sec"""
+    if not persistent:
+        # Idle connections are evicted on the next checkout, so each page
+        # opens a new one
+        db_pool.configure(idle_timeout=0)
+    try:
+        start = time.perf_counter()
+        read = 0
+        paginator = lazy_paginate(page_size, keyset=keyset,
+                                  persistent=persistent)
+        for read, _ in enumerate(paginator, 1):
+            if read == pages:
+                break
+        paginator.close()
+        return read / (time.perf_counter() - start)
+    finally:
+        if not persistent:
+            db_pool.configure()
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    ensure_rows(pages * page_size)
+    for keyset in (False, True):
+        before = pages_per_second(pages, page_size, keyset, persistent=False)
+        after = pages_per_second(pages, page_size, keyset, persistent=True)
+        mode = "keyset" if keyset else "offset"
+        print(f"{mode}: {before:.1f} pages/sec per-page connection, "
+              f"{after:.1f} pages/sec persistent ({after / before:.1f}x)")
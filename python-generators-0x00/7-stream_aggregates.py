@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+"""Single-pass aggregates over stream_user_ages, or pushed down to MySQL."""
+import math
+
+from seed import connect_to_prodev
+
+stream_user_ages = __import__('4-stream_ages').stream_user_ages
+
+
+class RunningStats:
+    """Count, sum, mean, variance, min and max in one pass (Welford)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def push(self, value):
+        """Adds one value"""
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Folds the values seen by another RunningStats into this one"""
+        if not other.count:
+            return
+        if not self.count:
+            self.__dict__.update(other.__dict__)
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """Population variance, or None before any value is seen"""
+        return self._m2 / self.count if self.count else None
+
+
+class TDigest:
+    """Merging t-digest sketch for approximate percentiles in bounded memory.
+
+    Values are buffered and periodically merged into at most about
+    `compression` centroids, with small centroids near the tails so
+    extreme percentiles stay accurate.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._centroids = []
+        self._buffer = []
+        self._buffer_size = compression * 5
+
+    def push(self, value, weight=1):
+        """Adds value with the given weight"""
+        self._buffer.append((value, weight))
+        self.count += weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """Folds another digest into this one"""
+        other._compress()
+        for mean, weight in other._centroids:
+            self.push(mean, weight)
+        if other.count:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+    def _scale(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        merged = []
+        mean, weight = points[0]
+        before = 0
+        for value, w in points[1:]:
+            k_low = self._scale(before / self.count)
+            k_high = self._scale(min(1.0, (before + weight + w) / self.count))
+            if k_high - k_low <= 1:
+                weight += w
+                mean += (value - mean) * w / weight
+            else:
+                merged.append((mean, weight))
+                before += weight
+                mean, weight = value, w
+        merged.append((mean, weight))
+        self._centroids = merged
+
+    def quantile(self, q):
+        """Returns the approximate q-quantile (0 <= q <= 1)"""
+        self._compress()
+        if not self._centroids:
+            return None
+        target = q * self.count
+        previous_center, previous_mean = 0.0, self.min
+        cumulative = 0
+        for mean, weight in self._centroids:
+            center = cumulative + weight / 2
+            if target <= center:
+                span = center - previous_center
+                if span <= 0:
+                    return mean
+                fraction = (target - previous_center) / span
+                return previous_mean + fraction * (mean - previous_mean)
+            previous_center, previous_mean = center, mean
+            cumulative += weight
+        span = self.count - previous_center
+        if span <= 0:
+            return self.max
+        fraction = (target - previous_center) / span
+        return previous_mean + fraction * (self.max - previous_mean)
+
+
+def stream_aggregates(values, percentiles=(50, 90, 95, 99), compression=100):
+    """Computes count/sum/mean/variance/min/max/percentiles in one pass"""
+    stats = RunningStats()
+    digest = TDigest(compression)
+    for value in values:
+        value = float(value)
+        stats.push(value)
+        digest.push(value)
+    result = {
+        'count': stats.count,
+        'sum': stats.total,
+        'mean': stats.mean if stats.count else None,
+        'variance': stats.variance,
+        'min': stats.min,
+        'max': stats.max,
+    }
+    for p in percentiles:
+        result[f'p{p}'] = digest.quantile(p / 100)
+    return result
+
+
+def sql_aggregates():
+    """Asks MySQL for the age aggregates directly"""
+    connection = connect_to_prodev()
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute(
+        "SELECT COUNT(age) AS count, SUM(age) AS sum, AVG(age) AS mean, "
+        "VAR_POP(age) AS variance, MIN(age) AS min, MAX(age) AS max "
+        "FROM user_data")
+    row = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    return {k: (float(v) if v is not None and k != 'count' else v)
+            for k, v in row.items()}
+
+
+def user_age_stats(pushdown=False, percentiles=(50, 90, 95, 99)):
+    """Age statistics over user_data.
+
+    pushdown=True returns the SQL-side aggregates only (no percentiles);
+    otherwise every statistic is computed in one pass over
+    stream_user_ages in constant memory.
+    """
+    if pushdown:
+        return sql_aggregates()
+    return stream_aggregates(stream_user_ages(), percentiles)
+
+
+if __name__ == "__main__":
+    for name, value in user_age_stats().items():
+        print(f"{name}: {value}")
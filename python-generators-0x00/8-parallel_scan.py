@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+"""Parallel range-partitioned scan of user_data.
+
+The table is split into contiguous user_id ranges that are read
+concurrently by a thread pool, one connection per worker from a pool
+sized to the workers (db_pool.dedicated_pool), so the scan neither
+waits on nor starves the shared pool. The drivers
+release the GIL while waiting on the socket, so threads are enough to
+keep several connections busy.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import db_pool
+from seed import connect_to_prodev
+
+build_query = __import__('1-batch_processing').build_query
+
+_DONE = object()
+
+
+def partition_bounds(partitions, connect=connect_to_prodev):
+    """Returns [(low, high), ...] user_id ranges with roughly equal row
+    counts; low is inclusive, high exclusive, None means unbounded.
+    """
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    count = cursor.fetchone()[0]
+    splits = []
+    for i in range(1, partitions):
+        cursor.execute(
+            "SELECT user_id FROM user_data ORDER BY user_id LIMIT 1 OFFSET %s",
+            (count * i // partitions,))
+        row = cursor.fetchone()
+        if row and (not splits or row[0] > splits[-1]):
+            splits.append(row[0])
+    cursor.close()
+    connection.close()
+    edges = [None] + splits + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def _put(out, item, stop):
+    """Puts item on out unless the scan is cancelled first"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _scan_partition(index, bounds, batch_size, columns, where, ordered,
+                    out, stop, connect):
+    """Reads one partition on its own connection and feeds out"""
+    low, high = bounds
+    predicates = list(where or ())
+    if low is not None:
+        predicates.append(('user_id', '>=', low))
+    if high is not None:
+        predicates.append(('user_id', '<', high))
+    query, params = build_query(columns, predicates)
+    if ordered:
+        query += " ORDER BY user_id"
+
+    connection = None
+    exhausted = False
+    try:
+        connection = connect()
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                exhausted = True
+                break
+            if not _put(out, (index, batch), stop):
+                break
+        if exhausted:
+            cursor.close()
+    except Exception as error:
+        # Forwarded to the consumer, which re-raises it.
+        _put(out, (index, error), stop)
+    finally:
+        if connection is not None:
+            if exhausted:
+                connection.close()
+            else:
+                connection.shutdown()
+        _put(out, (index, _DONE), stop)
+
+
+def parallel_scan(workers=4, partitions=None, batch_size=1000, ordered=False,
+                  columns=None, where=None, queue_depth=4):
+    """Yields batches of user_data rows read by workers in parallel.
+
+    The table is split into partitions ranges (default: one per worker).
+    ordered=True yields batches in user_id order, buffering at most
+    queue_depth batches per partition ahead of the consumer; otherwise
+    batches are yielded as soon as any worker produces them. columns and
+    where are pushed down as in stream_users_in_batches.
+    """
+    connections = db_pool.dedicated_pool(workers)
+    try:
+        ranges = partition_bounds(partitions or workers, connections.acquire)
+    except BaseException:
+        connections.close_all()
+        raise
+    stop = threading.Event()
+    if ordered:
+        queues = [queue.Queue(queue_depth) for _ in ranges]
+    else:
+        shared = queue.Queue(queue_depth * workers)
+        queues = [shared] * len(ranges)
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for index, bounds in enumerate(ranges):
+            pool.submit(_scan_partition, index, bounds, batch_size, columns,
+                        where, ordered, queues[index], stop,
+                        connections.acquire)
+
+        if ordered:
+            for out in queues:
+                while True:
+                    _, batch = out.get()
+                    if batch is _DONE:
+                        break
+                    if isinstance(batch, Exception):
+                        raise batch
+                    yield batch
+        else:
+            remaining = len(ranges)
+            while remaining:
+                _, batch = shared.get()
+                if batch is _DONE:
+                    remaining -= 1
+                    continue
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        connections.close_all()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    start = time.perf_counter()
+    rows = sum(len(batch) for batch in parallel_scan(workers))
+    elapsed = time.perf_counter() - start
+    print(f"{rows} rows with {workers} workers in {elapsed:.2f}s "
+          f"({rows / elapsed:.0f} rows/sec)")
@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+"""Async generator versions of the user_data streams, on a shared aiomysql
+pool (one per event loop).
+
+Rows are read through server-side (unbuffered) cursors and only fetched
+when the consumer asks for more, so a slow `async for` loop applies
+backpressure all the way to the MySQL socket.
+"""
+import asyncio
+import weakref
+
+import aiomysql
+
+from db_pool import settings_from_env
+
+build_query = __import__('1-batch_processing').build_query
+_paginate = __import__('2-lazy_paginate')
+
+# One pool (and the lock guarding its creation) per event loop: an
+# aiomysql pool is bound to the loop it was created on, so a later
+# asyncio.run() must not reuse one from a closed loop
+_pools = weakref.WeakKeyDictionary()
+_pool_locks = weakref.WeakKeyDictionary()
+
+
+def _pool_lock(loop):
+    lock = _pool_locks.get(loop)
+    if lock is None:
+        lock = _pool_locks[loop] = asyncio.Lock()
+    return lock
+
+
+async def get_pool(minsize=1, maxsize=None):
+    """Returns the running loop's aiomysql pool, creating it on first use
+    with the same PRODEV_* settings as db_pool.
+
+    Connections run in autocommit mode: aiomysql closes a connection
+    released inside a transaction, and without autocommit every SELECT
+    would leave one open, so each stream would pay a fresh connect.
+    """
+    loop = asyncio.get_running_loop()
+    async with _pool_lock(loop):
+        pool = _pools.get(loop)
+        if pool is None:
+            settings = settings_from_env()
+            pool = _pools[loop] = await aiomysql.create_pool(
+                host=settings['host'],
+                port=settings['port'],
+                user=settings['user'],
+                password=settings['password'],
+                db=settings['database'],
+                minsize=minsize,
+                maxsize=maxsize or settings['size'],
+                autocommit=True,
+            )
+    return pool
+
+
+async def close_pool():
+    """Closes the running loop's pool and waits for its connections to
+    go away
+    """
+    loop = asyncio.get_running_loop()
+    async with _pool_lock(loop):
+        pool = _pools.pop(loop, None)
+        if pool is not None:
+            pool.close()
+            await pool.wait_closed()
+
+
+async def _stream_batches(query, params, size):
+    """Yields fetchmany batches of query from a pooled connection"""
+    pool = await get_pool()
+    conn = await pool.acquire()
+    exhausted = False
+    try:
+        cursor = await conn.cursor(aiomysql.SSDictCursor)
+        await cursor.execute(query, params)
+        while True:
+            batch = await cursor.fetchmany(size)
+            if not batch:
+                break
+            yield batch
+        await cursor.close()
+        exhausted = True
+    finally:
+        if not exhausted:
+            # Closing the cursor would drain the unread rows; drop the
+            # connection instead and let the pool replace it.
+            conn.close()
+        pool.release(conn)
+
+
+async def stream_users(fetch_size=1000):
+    """Yields user_data rows one by one"""
+    async for batch in _stream_batches("SELECT * FROM user_data", (),
+                                       fetch_size):
+        for row in batch:
+            yield row
+
+
+async def stream_users_in_batches(batch_size, columns=None, where=None):
+    """Yields user_data rows in batches, with the projection and
+    predicates pushed down as in 1-batch_processing.
+    """
+    query, params = build_query(columns, where)
+    async for batch in _stream_batches(query, params, batch_size):
+        yield batch
+
+
+async def _fetch_page(query, params):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+
+
+async def lazy_paginate(page_size, keyset=False, key='user_id', token=None):
+    """Yields pages of user_data, by offset or by keyset seek (see
+    2-lazy_paginate.lazy_paginate for keyset and token).
+    """
+    if not keyset and token is None:
+        offset = 0
+        while True:
+            page = await _fetch_page(
+                "SELECT * FROM user_data LIMIT %s OFFSET %s",
+                (page_size, offset))
+            if not page:
+                break
+            yield page
+            offset += page_size
+        return
+
+    after = None
+    if token is not None:
+        token_key, value, user_id = _paginate.decode_token(token)
+        if token_key != key:
+            raise ValueError(
+                f"Token was issued for key {token_key!r}, not {key!r}")
+        after = (value, user_id)
+    while True:
+        page = await _fetch_page(*_paginate.seek_query(page_size, after, key))
+        if not page:
+            break
+        yield page
+        after = (page[-1][key], page[-1]['user_id'])
+
+
+async def main():
+    count = 0
+    async for _ in stream_users():
+        count += 1
+    print(f"Streamed {count} users")
+    await close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,320 @@
+#!/usr/bin/python3
+"""Process-wide MySQL connection pool for the ALX_prodev database.
+
+Settings come from the environment (see settings_from_env) or from
+configure(). Connections handed out by the pool behave like ordinary
+mysql.connector connections except that close() returns them to the pool
+and shutdown() discards them.
+
+A forked child never touches connections it inherited: they still belong
+to the parent, and closing them (or letting them be garbage collected,
+which shuts the socket down) would cut the parent off. The child opens
+its own instead, and the parent pings its idle connections after a fork.
+"""
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+import mysql.connector
+
+
+class PoolTimeout(mysql.connector.errors.PoolError):
+    """Raised when no connection frees up within the checkout timeout"""
+
+
+def settings_from_env():
+    """Returns the connection and pool settings from PRODEV_* variables"""
+    env = os.environ.get
+    return {
+        'host': env('PRODEV_DB_HOST', 'localhost'),
+        'port': int(env('PRODEV_DB_PORT', '3306')),
+        'user': env('PRODEV_DB_USER', 'root'),
+        'password': env('PRODEV_DB_PASSWORD', ''),
+        'database': env('PRODEV_DB_NAME', 'ALX_prodev'),
+        'size': int(env('PRODEV_POOL_SIZE', '5')),
+        'checkout_timeout': float(env('PRODEV_POOL_TIMEOUT', '30')),
+        'idle_timeout': float(env('PRODEV_POOL_IDLE_TIMEOUT', '300')),
+        'health_check_interval': float(env('PRODEV_POOL_HEALTH_CHECK', '30')),
+    }
+
+
+# Connections a forked child inherited from its parent, kept referenced
+# so they are never closed or garbage collected in the child
+_inherited = []
+# Bumped in the parent after every fork
+_fork_generation = 0
+# Every ConnectionPool in the process, so a forked child can detach them
+_pools = weakref.WeakSet()
+
+
+class PooledConnection:
+    """Proxy for a borrowed connection; close() hands it back"""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        self._pid = os.getpid()
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise mysql.connector.errors.OperationalError(
+                "Connection was returned to the pool")
+        return getattr(self._connection, name)
+
+    def _give_back(self, discard):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            if self._pid != os.getpid():
+                _inherited.append(connection)
+            else:
+                self._pool.release(connection, discard=discard)
+
+    def close(self):
+        """Returns the connection to the pool"""
+        self._give_back(discard=False)
+
+    def shutdown(self):
+        """Drops the connection, e.g. with an unread result still pending"""
+        self._give_back(discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of mysql.connector connections.
+
+    size caps the connections open at once; acquire() waits up to
+    checkout_timeout seconds for one to free up. Idle connections older
+    than idle_timeout are closed, and one idle for longer than
+    health_check_interval, or since before a fork, is pinged before being
+    handed out.
+    """
+
+    def __init__(self, size=5, checkout_timeout=30, idle_timeout=300,
+                 health_check_interval=30, **connect_args):
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_args = connect_args
+        self._idle = deque()
+        self._open = 0
+        self._lock = threading.Condition()
+        self._stats = {
+            'hits': 0, 'misses': 0, 'waits': 0, 'wait_seconds': 0.0,
+            'timeouts': 0, 'evictions': 0, 'health_check_failures': 0,
+        }
+        _pools.add(self)
+
+    def _detach(self):
+        """Forgets the parent's connections in a forked child.
+
+        Runs right after the fork, with no other threads, so the lock
+        (which another parent thread may have held) is replaced rather
+        than taken.
+        """
+        _inherited.extend(connection for connection, _, _ in self._idle)
+        self._idle = deque()
+        self._open = 0
+        self._lock = threading.Condition()
+
+    def _evict_idle(self, now):
+        """Closes idle connections unused for idle_timeout (lock held)"""
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            connection, _, _ = self._idle.popleft()
+            self._open -= 1
+            self._stats['evictions'] += 1
+            _quietly_close(connection)
+
+    def _healthy(self, connection, last_used, generation):
+        if generation == _fork_generation and \
+                time.monotonic() - last_used <= self.health_check_interval:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    def acquire(self, timeout=None):
+        """Borrows a connection, waiting up to timeout seconds for one"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = None
+        while True:
+            with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._evict_idle(now)
+                    if self._idle:
+                        connection, last_used, generation = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        self._open += 1
+                        connection = None
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No connection available within {timeout}s")
+                    if waited is None:
+                        waited = now
+                        self._stats['waits'] += 1
+                    self._lock.wait(remaining)
+                if waited is not None:
+                    self._stats['wait_seconds'] += time.monotonic() - waited
+                    waited = None
+
+            if connection is None:
+                try:
+                    connection = mysql.connector.connect(**self.connect_args)
+                except BaseException:
+                    with self._lock:
+                        self._open -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._stats['misses'] += 1
+                return PooledConnection(self, connection)
+
+            if self._healthy(connection, last_used, generation):
+                with self._lock:
+                    self._stats['hits'] += 1
+                return PooledConnection(self, connection)
+            with self._lock:
+                self._open -= 1
+            _quietly_close(connection)
+
+    def release(self, connection, discard=False):
+        """Returns a connection to the pool, or drops it if discard is set
+        or it cannot be reset to a clean state.
+        """
+        if not discard:
+            try:
+                if connection.unread_result:
+                    discard = True
+                elif connection.in_transaction:
+                    connection.rollback()
+            except mysql.connector.Error:
+                discard = True
+        if discard:
+            _quietly_close(connection, shutdown=True)
+        with self._lock:
+            if discard:
+                self._open -= 1
+            else:
+                self._idle.append(
+                    (connection, time.monotonic(), _fork_generation))
+            self._lock.notify()
+
+    def metrics(self):
+        """Returns hit/miss/wait counters and current occupancy"""
+        with self._lock:
+            metrics = dict(self._stats)
+            metrics.update(size=self.size, open=self._open,
+                           idle=len(self._idle),
+                           in_use=self._open - len(self._idle))
+        return metrics
+
+    def close_all(self):
+        """Closes every idle connection"""
+        with self._lock:
+            while self._idle:
+                connection, _, _ = self._idle.pop()
+                self._open -= 1
+                _quietly_close(connection)
+
+
+def _quietly_close(connection, shutdown=False):
+    try:
+        if shutdown:
+            connection.shutdown()
+        else:
+            connection.close()
+    except mysql.connector.Error:
+        pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _after_fork_in_parent():
+    global _fork_generation
+    _fork_generation += 1
+
+
+def _after_fork_in_child():
+    global _pool_lock
+    _pool_lock = threading.Lock()
+    for pool in list(_pools):
+        pool._detach()
+
+
+os.register_at_fork(after_in_parent=_after_fork_in_parent,
+                    after_in_child=_after_fork_in_child)
+
+
+def _install(settings):
+    """Builds the process-wide pool (_pool_lock held)"""
+    global _pool, _pool_pid
+    if _pool is not None:
+        if _pool_pid == os.getpid():
+            _pool.close_all()
+        else:
+            _inherited.append(_pool)
+    _pool = ConnectionPool(**settings)
+    _pool_pid = os.getpid()
+    return _pool
+
+
+def configure(**settings):
+    """Replaces the process-wide pool; settings override the environment"""
+    merged = settings_from_env()
+    merged.update(settings)
+    with _pool_lock:
+        return _install(merged)
+
+
+def get_pool():
+    """Returns the process-wide pool, creating it from the environment.
+
+    A forked child gets a fresh pool; the parent's, already detached,
+    stays referenced so its connections are never closed.
+    """
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            return _install(settings_from_env())
+        return _pool
+
+
+def dedicated_pool(size):
+    """Returns a new pool of up to size connections with the process-wide
+    pool's settings, for work that needs its own connections (e.g. one
+    per parallel worker) without starving other users of the shared pool.
+    close_all() it when done.
+    """
+    shared = get_pool()
+    return ConnectionPool(size=size,
+                          checkout_timeout=shared.checkout_timeout,
+                          idle_timeout=shared.idle_timeout,
+                          health_check_interval=shared.health_check_interval,
+                          **shared.connect_args)
+
+
+def acquire(timeout=None):
+    """Borrows a connection from the process-wide pool"""
+    return get_pool().acquire(timeout)
@@ -1,16 +1,22 @@
 #!/usr/bin/python3
 import mysql.connector
 import csv
+import time
+from itertools import islice
 from uuid import uuid4
 
+import db_pool
+
 
 def connect_db():
     """connect to the mysql database server """
+    settings = db_pool.settings_from_env()
     try:
         mydb = mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password=''
+        host=settings['host'],
+        port=settings['port'],
+        user=settings['user'],
+        password=settings['password']
         )
         return mydb
     except mysql.connector.Error as error:
@@ -32,15 +38,16 @@ def create_database(connection):
 
 
 def connect_to_prodev():
-    """connects the ALX_prodev database in MYSQL"""
+    """connects the ALX_prodev database in MYSQL
+
+    The connection is borrowed from the process-wide pool in db_pool;
+    closing it hands it back. db_pool.PoolTimeout is raised, not
+    swallowed, when every pooled connection stays busy.
+    """
     try:
-        mydb = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',
-            database='ALX_prodev'
-        )
-        return mydb
+        return db_pool.acquire()
+    except db_pool.PoolTimeout:
+        raise
     except mysql.connector.Error as error:
         print(f"Error: {error}")
         return None
@@ -55,7 +62,11 @@ def create_table(connection):
             user_id VARCHAR(36) PRIMARY KEY,
             name VARCHAR(255) NOT NULL,
             email VARCHAR(255) NOT NULL,
-            age DECIMAL NOT NULL    
+            age DECIMAL NOT NULL,
+            updated_at TIMESTAMP(6) NOT NULL
+                DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+            UNIQUE KEY uq_user_data_email (email),
+            KEY ix_user_data_updated_at (updated_at, user_id)
         )
         """
         cursor.execute(query)
@@ -65,6 +76,52 @@ def create_table(connection):
     finally:
         cursor.close()
 
+
+def ensure_change_tracking(connection):
+    """Adds the indexed updated_at column to a user_data table created
+    without it, so changed rows can be found without a full scan.
+    """
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = 'user_data' "
+            "AND column_name = 'updated_at'")
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                "ALTER TABLE user_data ADD COLUMN updated_at TIMESTAMP(6) "
+                "NOT NULL DEFAULT CURRENT_TIMESTAMP(6) "
+                "ON UPDATE CURRENT_TIMESTAMP(6), "
+                "ADD KEY ix_user_data_updated_at (updated_at, user_id)")
+    except mysql.connector.Error as error:
+        print(f"Error: {error}")
+    finally:
+        cursor.close()
+
+
+def ensure_email_index(connection):
+    """Adds the unique email index to a user_data table created without it.
+
+    Returns whether the index is in place; adding it fails, for example,
+    when the table already holds duplicate emails.
+    """
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'user_data' "
+            "AND index_name = 'uq_user_data_email'")
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                "ALTER TABLE user_data ADD UNIQUE KEY uq_user_data_email (email)")
+        return True
+    except mysql.connector.Error as error:
+        print(f"Error: {error}")
+        return False
+    finally:
+        cursor.close()
+
+
 def insert_data(connection, data):
     """Inserts data in the database if it doesn't exist (checked by email)."""
     try:
@@ -89,4 +146,100 @@ def insert_data(connection, data):
     except mysql.connector.Error as err:
         print(f"Error: {err}")
     finally:
-        cursor.close()
\ No newline at end of file
+        cursor.close()
+
+
+def insert_synthetic(connection, count, chunk_size=10000):
+    """Inserts count generated users, committing every chunk_size rows."""
+    try:
+        cursor = connection.cursor()
+        query = "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)"
+        for start in range(0, count, chunk_size):
+            rows = [
+                (str(uuid4()), f"User {i}", f"user{i}.{uuid4().hex[:8]}@example.com", 18 + i % 83)
+                for i in range(start, min(start + chunk_size, count))
+            ]
+            cursor.executemany(query, rows)
+            connection.commit()
+        print(f"Inserted {count} synthetic users.")
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+    finally:
+        cursor.close()
+
+
+def insert_data_bulk(connection, data, chunk_size=5000, commit_every=50000,
+                     load_data=False):
+    """Bulk-loads the CSV at data, skipping emails that already exist.
+
+    Rows are streamed in chunks of chunk_size through executemany with
+    INSERT IGNORE, relying on the unique email index for deduplication, and
+    committed every commit_every rows. load_data=True hands the whole file
+    to LOAD DATA LOCAL INFILE instead (the connection must be opened with
+    allow_local_infile=True). Returns the inserted/skipped counts.
+
+    If the unique index can't be added (the table already holds duplicate
+    emails), INSERT IGNORE would not skip anything, so each row is instead
+    inserted only if no row has its email yet; that checks the table row by
+    row and is much slower. load_data=True needs the index and returns
+    None without loading anything when it is missing.
+    """
+    indexed = ensure_email_index(connection)
+    if load_data and not indexed:
+        print("Error: LOAD DATA needs the unique email index; nothing loaded")
+        return None
+    if not indexed:
+        print("Warning: no unique email index; deduplicating row by row")
+    start = time.perf_counter()
+    total = 0
+    inserted = 0
+    try:
+        cursor = connection.cursor()
+        if load_data:
+            with open(data, newline='', encoding='utf-8') as f:
+                total = sum(1 for _ in csv.reader(f)) - 1
+            cursor.execute(
+                "LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE user_data "
+                "FIELDS TERMINATED BY ',' ENCLOSED BY '\"' "
+                "LINES TERMINATED BY '\\n' IGNORE 1 LINES "
+                "(name, email, age) SET user_id = UUID()",
+                (data,))
+            inserted = cursor.rowcount
+        else:
+            if indexed:
+                query = ("INSERT IGNORE INTO user_data (user_id, name, email, age) "
+                         "VALUES (%s, %s, %s, %s)")
+            else:
+                query = ("INSERT INTO user_data (user_id, name, email, age) "
+                         "SELECT %s, %s, %s, %s FROM DUAL WHERE NOT EXISTS "
+                         "(SELECT 1 FROM user_data WHERE email = %s)")
+            pending = 0
+            with open(data, newline='', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                while True:
+                    chunk = [
+                        (str(uuid4()), row['name'], row['email'], row['age'])
+                        + (() if indexed else (row['email'],))
+                        for row in islice(reader, chunk_size)
+                    ]
+                    if not chunk:
+                        break
+                    cursor.executemany(query, chunk)
+                    total += len(chunk)
+                    inserted += cursor.rowcount
+                    pending += len(chunk)
+                    if pending >= commit_every:
+                        connection.commit()
+                        pending = 0
+        connection.commit()
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - start
+    skipped = total - inserted
+    rate = total / elapsed if elapsed else 0.0
+    print(f"Bulk insertion completed: {inserted} inserted, {skipped} skipped, "
+          f"{rate:.0f} rows/sec.")
+    return {'inserted': inserted, 'skipped': skipped, 'rows_per_sec': rate}
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Unit tests for the async user_data streams.
+
+aiomysql.create_pool is swapped for a small pool over an in-memory SQLite
+user_data table, which speaks the subset of the aiomysql API the module
+uses.
+
+This module contains tests for:
+- `stream_users`, `stream_users_in_batches`, `lazy_paginate`: rows,
+  pushdown, keyset pages and tokens
+- `get_pool` / `close_pool`: one pool per event loop, connection reuse
+"""
+
+import asyncio
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+async_streams = __import__('9-async_streams')
+page_token = __import__('2-lazy_paginate').page_token
+
+USERS = [(f"{i:04d}", f"user{i}", f"user{i}@example.com", 20 + i % 50)
+         for i in range(250)]
+
+
+class FakeCursor:
+    """aiomysql cursor over sqlite3; usable with await or async with."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.database.cursor()
+
+    def __await__(self):
+        yield from ()
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def execute(self, query, params=()):
+        self._cursor.execute(query.replace('%s', '?'), params)
+        if not self.connection.autocommit:
+            self.connection.in_transaction = True
+
+    async def fetchmany(self, size):
+        return [dict(row) for row in self._cursor.fetchmany(size)]
+
+    async def fetchall(self):
+        return [dict(row) for row in self._cursor.fetchall()]
+
+    async def close(self):
+        self._cursor.close()
+
+
+class FakeConnection:
+    """aiomysql connection stand-in; outside autocommit mode a query
+    leaves a transaction open, as with MySQL.
+    """
+
+    def __init__(self, database, autocommit):
+        self.database = database
+        self.autocommit = autocommit
+        self.in_transaction = False
+        self.closed = False
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.in_transaction
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAcquire:
+    """pool.acquire() result: awaitable and an async context manager."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __await__(self):
+        return self.pool._acquire().__await__()
+
+    async def __aenter__(self):
+        self.conn = await self.pool._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc_info):
+        self.pool.release(self.conn)
+
+
+class FakePool:
+    """aiomysql pool stand-in bound, like the real one, to its loop.
+
+    Like aiomysql, release() reuses a connection unless it is closed or
+    still in a transaction, which it closes instead.
+    """
+
+    def __init__(self, database, autocommit=False):
+        self.database = database
+        self.autocommit = autocommit
+        self.loop = asyncio.get_running_loop()
+        self.connections = []
+        self.free = []
+        self.released = 0
+        self.closed = False
+
+    async def _acquire(self):
+        if self.closed or asyncio.get_running_loop() is not self.loop:
+            raise RuntimeError("pool used outside the loop it belongs to")
+        if self.free:
+            return self.free.pop()
+        conn = FakeConnection(self.database, self.autocommit)
+        self.connections.append(conn)
+        return conn
+
+    def acquire(self):
+        return FakeAcquire(self)
+
+    def release(self, conn):
+        self.released += 1
+        if conn.get_transaction_status():
+            conn.close()
+        if not conn.closed:
+            self.free.append(conn)
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+class AsyncStreamsTestCase(unittest.TestCase):
+    """Base class routing aiomysql.create_pool to FakePool."""
+
+    def setUp(self):
+        self.database = sqlite3.connect(":memory:")
+        self.database.row_factory = sqlite3.Row
+        self.database.execute(
+            "CREATE TABLE user_data (user_id TEXT PRIMARY KEY, name TEXT, "
+            "email TEXT, age INTEGER)")
+        self.database.executemany("INSERT INTO user_data VALUES (?, ?, ?, ?)",
+                                  USERS)
+        self.pools = []
+
+        async def create_pool(**settings):
+            pool = FakePool(self.database, settings.get('autocommit', False))
+            self.pools.append(pool)
+            return pool
+
+        patcher = patch.object(async_streams.aiomysql, 'create_pool', create_pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_async(self, coroutine):
+        async def run():
+            try:
+                return await coroutine
+            finally:
+                await async_streams.close_pool()
+        return asyncio.run(run())
+
+
+async def collect(generator):
+    return [item async for item in generator]
+
+
+class TestStreams(AsyncStreamsTestCase):
+    """Tests for the async generators."""
+
+    def test_stream_users(self):
+        """Test every row comes through once, as a dict."""
+        rows = self.run_async(collect(async_streams.stream_users(fetch_size=64)))
+        self.assertEqual([row['user_id'] for row in rows],
+                         [user[0] for user in USERS])
+        self.assertEqual(self.pools[0].released, 1)
+
+    def test_stream_users_in_batches_pushdown(self):
+        """Test batch sizes, projection and predicates."""
+        batches = self.run_async(collect(async_streams.stream_users_in_batches(
+            40, columns=['user_id', 'age'], where=[('age', '>', 60)])))
+        rows = [row for batch in batches for row in batch]
+        self.assertTrue(all(len(batch) <= 40 for batch in batches))
+        self.assertEqual(len(rows), sum(1 for user in USERS if user[3] > 60))
+        self.assertTrue(all(set(row) == {'user_id', 'age'} for row in rows))
+
+    def test_abandoned_stream_drops_connection(self):
+        """Test leaving a stream early closes its connection."""
+        async def first_row():
+            stream = async_streams.stream_users(fetch_size=10)
+            row = await stream.__anext__()
+            await stream.aclose()
+            return row
+
+        self.assertEqual(self.run_async(first_row())['user_id'], USERS[0][0])
+        self.assertTrue(self.pools[0].connections[0].closed)
+
+    def test_offset_and_keyset_pages_match(self):
+        """Test offset and keyset pagination yield the same pages."""
+        by_offset = self.run_async(collect(async_streams.lazy_paginate(60)))
+        by_keyset = self.run_async(
+            collect(async_streams.lazy_paginate(60, keyset=True)))
+        self.assertEqual(by_offset, by_keyset)
+        self.assertEqual([len(page) for page in by_keyset], [60, 60, 60, 60, 10])
+
+    def test_token_resumes_after_page(self):
+        """Test a continuation token picks up after its page, by age."""
+        pages = self.run_async(
+            collect(async_streams.lazy_paginate(100, keyset=True, key='age')))
+        rest = self.run_async(collect(async_streams.lazy_paginate(
+            100, key='age', token=page_token(pages[0], 'age'))))
+        self.assertEqual(rest, pages[1:])
+        with self.assertRaises(ValueError):
+            self.run_async(collect(async_streams.lazy_paginate(
+                100, token=page_token(pages[0], 'age'))))
+
+
+class TestPoolPerLoop(AsyncStreamsTestCase):
+    """Tests for get_pool across event loops."""
+
+    def test_each_loop_gets_its_own_pool(self):
+        """Test a second asyncio.run does not reuse the first loop's pool."""
+        for _ in range(2):
+            rows = asyncio.run(collect(async_streams.stream_users()))
+            self.assertEqual(len(rows), len(USERS))
+        self.assertEqual(len(self.pools), 2)
+        self.assertIsNot(self.pools[0].loop, self.pools[1].loop)
+
+    def test_pool_is_shared_within_a_loop(self):
+        """Test concurrent callers on one loop share a single pool."""
+        async def concurrently():
+            return await asyncio.gather(
+                *[async_streams.get_pool() for _ in range(10)])
+
+        pools = self.run_async(concurrently())
+        self.assertEqual(len(self.pools), 1)
+        self.assertTrue(all(pool is pools[0] for pool in pools))
+
+    def test_released_connections_are_reused(self):
+        """Test streams and pages reuse one connection instead of reconnecting."""
+        async def several():
+            await collect(async_streams.stream_users())
+            await collect(async_streams.lazy_paginate(60, keyset=True))
+            await collect(async_streams.stream_users_in_batches(100))
+
+        self.run_async(several())
+        self.assertEqual(len(self.pools[0].connections), 1)
+        self.assertFalse(self.pools[0].connections[0].closed)
+
+    def test_close_pool(self):
+        """Test close_pool closes the loop's pool and a new one follows."""
+        async def close_and_reopen():
+            first = await async_streams.get_pool()
+            await async_streams.close_pool()
+            return first, await async_streams.get_pool()
+
+        first, second = self.run_async(close_and_reopen())
+        self.assertTrue(first.closed)
+        self.assertIsNot(first, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Unit tests for batch streaming.
+
+This module contains tests for:
+- `stream_users_in_batches`: error handling with and without raise_errors,
+  PoolTimeout
+- `to_columns`: object arrays for text columns
+- `batch_processing`: client-side age filtering with a projection
+"""
+
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import mysql.connector
+
+import db_pool
+
+batch_module = __import__('1-batch_processing')
+
+
+class TestStreamErrors(unittest.TestCase):
+    """Tests for how stream_users_in_batches reports database errors."""
+
+    def setUp(self):
+        patcher = patch.object(
+            db_pool, 'acquire',
+            side_effect=mysql.connector.errors.InterfaceError("server gone"))
+        self.acquire = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_errors_end_the_stream_by_default(self):
+        """Test the default prints the error and stops."""
+        with patch('builtins.print') as printed:
+            self.assertEqual(list(batch_module.stream_users_in_batches(10)), [])
+        printed.assert_called_once()
+
+    def test_raise_errors(self):
+        """Test raise_errors=True re-raises the error."""
+        with self.assertRaises(mysql.connector.errors.InterfaceError):
+            list(batch_module.stream_users_in_batches(10, raise_errors=True))
+
+    def test_pool_timeout_always_raises(self):
+        """Test an exhausted pool is not reported as an empty stream."""
+        self.acquire.side_effect = db_pool.PoolTimeout("busy")
+        with self.assertRaises(db_pool.PoolTimeout):
+            list(batch_module.stream_users_in_batches(10))
+
+
+class TestToColumns(unittest.TestCase):
+    """Tests for the columnar transpose."""
+
+    def test_text_columns_keep_their_objects(self):
+        """Test text columns are object arrays, not fixed-width strings."""
+        if batch_module.np is None:
+            self.skipTest("NumPy is not installed")
+        names = ('name', 'age')
+        rows = [('Al', Decimal(30)), ('A' * 200, Decimal(20))]
+        batch = batch_module.to_columns(names, rows)
+        self.assertEqual(batch['name'].dtype, object)
+        self.assertIs(batch['name'][0], rows[0][0])
+        self.assertEqual(list(batch['age']), [30.0, 20.0])
+
+
+class TestClientSideFilter(unittest.TestCase):
+    """Tests for batch_processing with pushdown=False."""
+
+    ROWS = [('Alice', Decimal(31)), ('Bob', Decimal(19))]
+
+    def setUp(self):
+        connection = MagicMock()
+        self.cursor = connection.cursor.return_value
+        self.cursor.column_names = ('name', 'age')
+        patcher = patch.object(db_pool, 'acquire', return_value=connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetches_age_for_a_projection_without_it(self):
+        """Test age is fetched for the filter and dropped afterwards."""
+        self.cursor.fetchmany.side_effect = [self.ROWS, []]
+        [batch] = batch_module.batch_processing(
+            10, columns=['name'], columnar=True, pushdown=False)
+        query, _ = self.cursor.execute.call_args[0]
+        self.assertEqual(query, "SELECT name, age FROM user_data")
+        self.assertEqual(list(batch), ['name'])
+        self.assertEqual(list(batch['name']), ['Alice'])
+
+    def test_dict_batches_drop_age_too(self):
+        """Test row batches also come back with only the requested columns."""
+        self.cursor.fetchmany.side_effect = [
+            [{'name': n, 'age': a} for n, a in self.ROWS], []]
+        [batch] = batch_module.batch_processing(
+            10, columns=['name'], pushdown=False)
+        self.assertEqual(batch, [{'name': 'Alice'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Unit tests for the MySQL connection pool.
+
+This module contains tests for:
+- `ConnectionPool`: reuse and checkout timeouts
+- `connect_to_prodev`: PoolTimeout reaches the caller
+- `dedicated_pool`: separate capacity with the shared settings
+- forking: a child leaves its parent's connections alone
+"""
+
+import gc
+import os
+import socket
+import unittest
+from unittest.mock import MagicMock, patch
+
+import db_pool
+import seed
+
+
+def fake_connection():
+    """A connection as far as the pool looks at one."""
+    connection = MagicMock()
+    connection.unread_result = False
+    connection.in_transaction = False
+    return connection
+
+
+class PoolTestCase(unittest.TestCase):
+    """Base class swapping the driver's connect for fake connections."""
+
+    def setUp(self):
+        patcher = patch('db_pool.mysql.connector.connect',
+                        side_effect=lambda **kwargs: fake_connection())
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestConnectionPool(PoolTestCase):
+    """Tests for ConnectionPool."""
+
+    def test_reuses_released_connections(self):
+        """Test a closed proxy hands its connection to the next caller."""
+        pool = db_pool.ConnectionPool(size=2)
+        first = pool.acquire()
+        raw = first._connection
+        first.close()
+        self.assertIs(pool.acquire()._connection, raw)
+        self.assertEqual(self.connect.call_count, 1)
+
+    def test_times_out_when_exhausted(self):
+        """Test acquire raises PoolTimeout once size connections are out."""
+        pool = db_pool.ConnectionPool(size=1, checkout_timeout=0.05)
+        held = pool.acquire()
+        with self.assertRaises(db_pool.PoolTimeout):
+            pool.acquire()
+        held.close()
+
+
+class TestConnectToProdev(PoolTestCase):
+    """Tests for seed.connect_to_prodev on the shared pool."""
+
+    def setUp(self):
+        super().setUp()
+        db_pool.configure(size=2, checkout_timeout=0.05)
+        self.addCleanup(db_pool.configure)
+
+    def test_pool_timeout_propagates(self):
+        """Test running out of connections raises instead of returning None."""
+        held = [seed.connect_to_prodev(), seed.connect_to_prodev()]
+        with patch('builtins.print'):
+            with self.assertRaises(db_pool.PoolTimeout):
+                seed.connect_to_prodev()
+        for connection in held:
+            connection.close()
+
+    def test_dedicated_pool_has_its_own_capacity(self):
+        """Test a dedicated pool is not limited by the shared one."""
+        held = [seed.connect_to_prodev(), seed.connect_to_prodev()]
+        workers = db_pool.dedicated_pool(4)
+        extra = [workers.acquire() for _ in range(4)]
+        self.assertEqual(workers.metrics()['in_use'], 4)
+        self.assertEqual(workers.connect_args,
+                         db_pool.get_pool().connect_args)
+        for connection in held + extra:
+            connection.close()
+        workers.close_all()
+
+
+class SocketConnection:
+    """A fake connection over a socket pair that, like the driver's
+    socket, shuts the socket down when garbage collected.
+    """
+
+    unread_result = False
+    in_transaction = False
+
+    def __init__(self):
+        self.sock, self.peer = socket.socketpair()
+        self.pings = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+
+    def close(self):
+        self.sock.close()
+
+    def __del__(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "needs os.fork")
+class TestFork(unittest.TestCase):
+    """Tests for pools shared with a forked child."""
+
+    def setUp(self):
+        patcher = patch('db_pool.mysql.connector.connect',
+                        side_effect=lambda **kwargs: SocketConnection())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        db_pool.configure(size=2)
+        self.addCleanup(db_pool.configure)
+
+    def test_child_does_not_shut_down_parent_sockets(self):
+        """Test a child's pool use keeps the parent's idle socket usable."""
+        connection = db_pool.acquire()
+        raw = connection._connection
+        connection.close()
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                child = db_pool.acquire()
+                status = 0 if child._connection is not raw else 1
+                child.close()
+                gc.collect()
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+        again = db_pool.acquire()
+        self.assertIs(again._connection, raw)
+        self.assertEqual(raw.pings, 1)
+        raw.sock.sendall(b'ping')
+        self.assertEqual(raw.peer.recv(4), b'ping')
+        again.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Unit tests for the streaming export.
+
+This module contains tests for:
+- `export_users`: complete exports land at path, failed ones leave
+  nothing behind and raise
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import mysql.connector
+
+export_module = __import__('11-export_users')
+
+BATCHES = [[{'user_id': str(i), 'name': f'user{i}'}] for i in range(3)]
+
+
+def fake_stream(error=None):
+    """Return a stand-in for stream_users_in_batches."""
+    def stream(batch_size, columns=None, where=None, raise_errors=False):
+        for i, batch in enumerate(BATCHES):
+            if error is not None and i == 2:
+                raise error
+            yield batch
+    return stream
+
+
+class TestExportUsers(unittest.TestCase):
+    """Tests for export_users with the database swapped out."""
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, 'users.jsonl')
+        patcher = patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def export(self, **options):
+        with patch.object(export_module, 'stream_users_in_batches',
+                          fake_stream(**options)):
+            return export_module.export_users(self.path, 'jsonl')
+
+    def test_complete_export(self):
+        """Test every row reaches the file and no partial file is left."""
+        stats = self.export()
+        self.assertEqual(stats['rows'], 3)
+        with open(self.path) as file:
+            self.assertEqual([json.loads(line) for line in file],
+                             [row for batch in BATCHES for row in batch])
+        self.assertFalse(os.path.exists(self.path + '.partial'))
+
+    def test_database_error_fails_the_export(self):
+        """Test a lost connection mid-export raises and leaves no file."""
+        with self.assertRaises(mysql.connector.Error):
+            self.export(error=mysql.connector.errors.OperationalError(
+                "Lost connection to MySQL server during query"))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.partial'))
+
+    def test_writer_error_fails_the_export(self):
+        """Test an error while writing raises and leaves no file."""
+        with patch.object(export_module._TextWriter, 'write',
+                          side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.export()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.partial'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Unit tests for the read-ahead paginator.
+
+This module contains tests for:
+- `lazy_paginate_prefetch`: page order, errors and closing early
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+lazy_paginate_module = __import__('2-lazy_paginate')
+
+PAGES = [[{'user_id': str(i)}] for i in range(3)]
+
+
+def fake_pages(pages=PAGES, error=None):
+    """Return a stand-in for lazy_paginate over fixed pages."""
+    def lazy_paginate(*args, **kwargs):
+        yield from pages
+        if error is not None:
+            raise error
+    return lazy_paginate
+
+
+class TestLazyPaginatePrefetch(unittest.TestCase):
+    """Tests for lazy_paginate_prefetch with the database swapped out."""
+
+    def prefetch(self, **options):
+        # The generator calls lazy_paginate on its first next()
+        patcher = patch.object(lazy_paginate_module, 'lazy_paginate',
+                               fake_pages(**options))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return lazy_paginate_module.lazy_paginate_prefetch(10, depth=2)
+
+    def close_within(self, generator, seconds=5):
+        """Close generator on a helper thread; fail if it hangs."""
+        closer = threading.Thread(target=generator.close, daemon=True)
+        closer.start()
+        closer.join(seconds)
+        self.assertFalse(closer.is_alive(), "close() did not return")
+
+    def test_yields_pages_in_order(self):
+        """Test every page comes through once, in order."""
+        self.assertEqual(list(self.prefetch()), PAGES)
+
+    def test_reader_error_is_raised(self):
+        """Test an error in the reader reaches the consumer."""
+        pages = self.prefetch(error=RuntimeError("lost connection"))
+        with self.assertRaises(RuntimeError):
+            list(pages)
+
+    def test_close_after_reader_finished(self):
+        """Test closing early returns while the reader waits on a full queue."""
+        pages = self.prefetch()
+        next(pages)
+        time.sleep(0.3)  # the reader has filled the queue and is finishing
+        self.close_within(pages)
+
+    def test_close_with_pending_error(self):
+        """Test closing early does not hang on a queued error."""
+        pages = self.prefetch(error=RuntimeError("lost connection"))
+        next(pages)
+        time.sleep(0.3)
+        self.close_within(pages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Unit tests for seeding helpers.
+
+This module contains tests for:
+- `insert_data_bulk`: deduplication with and without the unique email index
+"""
+
+import csv
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import mysql.connector
+
+import seed
+
+ROWS = [{'name': 'Alice', 'email': 'alice@example.com', 'age': '31'},
+        {'name': 'Bob', 'email': 'bob@example.com', 'age': '45'}]
+
+
+class TestInsertDataBulk(unittest.TestCase):
+    """Tests for insert_data_bulk against a mocked connection."""
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, 'users.csv')
+        with open(self.path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['name', 'email', 'age'])
+            writer.writeheader()
+            writer.writerows(ROWS)
+        self.connection = MagicMock()
+        self.cursor = self.connection.cursor.return_value
+        self.cursor.rowcount = 2
+        patcher = patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def executemany_query(self):
+        (query, rows), _ = self.cursor.executemany.call_args
+        return query, rows
+
+    def test_uses_insert_ignore_with_index(self):
+        """Test the unique index lets INSERT IGNORE skip duplicates."""
+        self.cursor.fetchone.return_value = (1,)
+        stats = seed.insert_data_bulk(self.connection, self.path)
+        query, rows = self.executemany_query()
+        self.assertTrue(query.startswith("INSERT IGNORE"))
+        self.assertEqual(len(rows[0]), 4)
+        self.assertEqual(stats['inserted'], 2)
+
+    def test_falls_back_to_dedup_query_without_index(self):
+        """Test a failed index build switches to an email NOT EXISTS check."""
+        self.cursor.fetchone.return_value = (0,)
+        self.cursor.execute.side_effect = [
+            None, mysql.connector.errors.IntegrityError("Duplicate entry")]
+        seed.insert_data_bulk(self.connection, self.path)
+        query, rows = self.executemany_query()
+        self.assertNotIn("IGNORE", query)
+        self.assertIn("WHERE NOT EXISTS", query)
+        self.assertEqual(rows[0][-1], 'alice@example.com')
+
+    def test_load_data_aborts_without_index(self):
+        """Test LOAD DATA refuses to run without the unique index."""
+        self.cursor.fetchone.return_value = (0,)
+        self.cursor.execute.side_effect = [
+            None, mysql.connector.errors.IntegrityError("Duplicate entry")]
+        self.assertIsNone(
+            seed.insert_data_bulk(self.connection, self.path, load_data=True))
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
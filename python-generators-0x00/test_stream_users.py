@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""Unit tests for row streaming.
+
+This module contains tests for:
+- `stream_users`: PoolTimeout reaches the caller in both modes
+"""
+
+import unittest
+from unittest.mock import patch
+
+import db_pool
+
+stream_module = __import__('0-stream_users')
+
+
+class TestStreamUsers(unittest.TestCase):
+    """Tests for stream_users on an exhausted pool."""
+
+    def test_pool_timeout_propagates(self):
+        """Test an exhausted pool raises instead of yielding nothing."""
+        with patch.object(db_pool, 'acquire',
+                          side_effect=db_pool.PoolTimeout("pool busy")):
+            for server_side in (False, True):
+                with self.subTest(server_side=server_side):
+                    with self.assertRaises(db_pool.PoolTimeout):
+                        list(stream_module.stream_users(server_side))
+
+
+if __name__ == '__main__':
+    unittest.main()